@@ -0,0 +1,43 @@
+"""Add answer_cache_entries and corpus_versions tables
+
+Revision ID: 099814a89047
+Revises: 8b4cc3744e73
+Create Date: 2026-10-17 10:03:17.914025
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import pgvector
+
+
+# revision identifiers, used by Alembic.
+revision = '099814a89047'
+down_revision = '8b4cc3744e73'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('corpus_versions',
+    sa.Column('collection', sa.String(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('collection')
+    )
+    op.create_table('answer_cache_entries',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('collection', sa.String(), nullable=False),
+    sa.Column('corpus_version', sa.Integer(), nullable=False),
+    sa.Column('query_text', sa.Text(), nullable=False),
+    sa.Column('query_embedding', pgvector.sqlalchemy.Vector(dim=768), nullable=False),
+    sa.Column('answer', sa.Text(), nullable=False),
+    sa.Column('hit_count', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_answer_cache_entries_collection'), 'answer_cache_entries', ['collection'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_answer_cache_entries_collection'), table_name='answer_cache_entries')
+    op.drop_table('answer_cache_entries')
+    op.drop_table('corpus_versions')
@@ -0,0 +1,72 @@
+"""Add content_tsv full-text column and GIN index to document_chunks
+
+Revision ID: 2b3cd0c9c21a
+Revises: 099814a89047
+Create Date: 2026-10-17 11:20:52.377104
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '2b3cd0c9c21a'
+down_revision = '099814a89047'
+branch_labels = None
+depends_on = None
+
+BACKFILL_BATCH_SIZE = 5000
+
+
+def upgrade():
+    # A plain nullable column is a catalog-only change. A STORED generated column would rewrite
+    # all of document_chunks under an ACCESS EXCLUSIVE lock, blocking search and ingestion.
+    op.add_column('document_chunks', sa.Column('content_tsv', postgresql.TSVECTOR(), nullable=True))
+
+    # New and edited chunks get content_tsv from a trigger (also fires for COPY).
+    op.execute("""
+        CREATE OR REPLACE FUNCTION document_chunks_content_tsv_update() RETURNS trigger AS $$
+        BEGIN
+            NEW.content_tsv := to_tsvector('simple'::regconfig, NEW.content);
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute(
+        "CREATE TRIGGER document_chunks_content_tsv BEFORE INSERT OR UPDATE OF content ON document_chunks "
+        "FOR EACH ROW EXECUTE FUNCTION document_chunks_content_tsv_update()"
+    )
+
+    with op.get_context().autocommit_block():
+        # Backfill existing rows in short transactions so row locks are held only briefly.
+        connection = op.get_bind()
+        while True:
+            result = connection.execute(
+                sa.text("""
+                    UPDATE document_chunks SET content_tsv = to_tsvector('simple'::regconfig, content)
+                    WHERE id IN (
+                        SELECT id FROM document_chunks WHERE content_tsv IS NULL LIMIT :batch_size
+                    )
+                """),
+                {"batch_size": BACKFILL_BATCH_SIZE},
+            )
+            if result.rowcount == 0:
+                break
+
+        op.create_index(
+            'ix_document_chunks_content_tsv',
+            'document_chunks',
+            ['content_tsv'],
+            unique=False,
+            postgresql_using='gin',
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_document_chunks_content_tsv', table_name='document_chunks', postgresql_concurrently=True)
+    op.execute("DROP TRIGGER IF EXISTS document_chunks_content_tsv ON document_chunks")
+    op.execute("DROP FUNCTION IF EXISTS document_chunks_content_tsv_update()")
+    op.drop_column('document_chunks', 'content_tsv')
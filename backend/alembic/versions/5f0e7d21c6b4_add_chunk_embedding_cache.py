@@ -0,0 +1,30 @@
+"""Add chunk_embedding_cache table
+
+Revision ID: 5f0e7d21c6b4
+Revises: 2b3cd0c9c21a
+Create Date: 2026-10-17 12:41:09.530117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import pgvector
+
+
+# revision identifiers, used by Alembic.
+revision = '5f0e7d21c6b4'
+down_revision = '2b3cd0c9c21a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('chunk_embedding_cache',
+    sa.Column('content_hash', sa.String(length=64), nullable=False),
+    sa.Column('embedding', pgvector.sqlalchemy.Vector(dim=768), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('content_hash')
+    )
+
+
+def downgrade():
+    op.drop_table('chunk_embedding_cache')
@@ -0,0 +1,44 @@
+"""Add HNSW index to document_chunks.embedding
+
+Revision ID: 8b4cc3744e73
+Revises: c09afb93a7fb
+Create Date: 2026-10-17 09:12:41.502318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b4cc3744e73'
+down_revision = 'c09afb93a7fb'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Plain b-tree indexes used by the collection filter (documents.collection)
+    # and the chunk -> document join (document_chunks.document_id).
+    op.create_index(op.f('ix_documents_collection'), 'documents', ['collection'], unique=False)
+    op.create_index(op.f('ix_document_chunks_document_id'), 'document_chunks', ['document_id'], unique=False)
+
+    # Building an HNSW graph over a large table takes a while, so build it
+    # CONCURRENTLY (outside of a transaction) to avoid locking out ingestion.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_document_chunks_embedding_hnsw',
+            'document_chunks',
+            ['embedding'],
+            unique=False,
+            postgresql_using='hnsw',
+            postgresql_with={'m': 16, 'ef_construction': 64},
+            postgresql_ops={'embedding': 'vector_l2_ops'},
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_document_chunks_embedding_hnsw', table_name='document_chunks', postgresql_concurrently=True)
+    op.drop_index(op.f('ix_document_chunks_document_id'), table_name='document_chunks')
+    op.drop_index(op.f('ix_documents_collection'), table_name='documents')
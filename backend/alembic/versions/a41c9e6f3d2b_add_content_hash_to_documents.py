@@ -0,0 +1,26 @@
+"""Add content_hash to documents
+
+Revision ID: a41c9e6f3d2b
+Revises: 5f0e7d21c6b4
+Create Date: 2026-10-17 14:02:37.118425
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a41c9e6f3d2b'
+down_revision = '5f0e7d21c6b4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('documents', sa.Column('content_hash', sa.String(length=64), nullable=True))
+    op.create_index(op.f('ix_documents_content_hash'), 'documents', ['content_hash'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_documents_content_hash'), table_name='documents')
+    op.drop_column('documents', 'content_hash')
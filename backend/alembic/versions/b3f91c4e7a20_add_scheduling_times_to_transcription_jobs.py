@@ -0,0 +1,26 @@
+"""Add scheduling timestamps to transcription jobs
+
+Revision ID: b3f91c4e7a20
+Revises: d7e2b8a15c90
+Create Date: 2026-10-17 16:02:37.418205
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3f91c4e7a20'
+down_revision = 'd7e2b8a15c90'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('transcription_jobs', sa.Column('started_at', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('transcription_jobs', sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade():
+    op.drop_column('transcription_jobs', 'finished_at')
+    op.drop_column('transcription_jobs', 'started_at')
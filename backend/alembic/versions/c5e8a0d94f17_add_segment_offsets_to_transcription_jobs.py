@@ -0,0 +1,24 @@
+"""Add segment offsets to transcription jobs
+
+Revision ID: c5e8a0d94f17
+Revises: b3f91c4e7a20
+Create Date: 2026-10-17 16:41:09.275530
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5e8a0d94f17'
+down_revision = 'b3f91c4e7a20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('transcription_jobs', sa.Column('segment_offsets', sa.JSON(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('transcription_jobs', 'segment_offsets')
@@ -0,0 +1,32 @@
+"""Add ingestion checkpoint columns to documents
+
+Revision ID: d7e2b8a15c90
+Revises: a41c9e6f3d2b
+Create Date: 2026-10-17 14:48:51.602318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd7e2b8a15c90'
+down_revision = 'a41c9e6f3d2b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('documents', sa.Column('source_path', sa.String(), nullable=True))
+    op.add_column('documents', sa.Column('indexed_chunk_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('documents', sa.Column('last_completed_batch', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('documents', sa.Column('progress_text', sa.String(), nullable=True))
+    op.add_column('documents', sa.Column('error_message', sa.Text(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('documents', 'error_message')
+    op.drop_column('documents', 'progress_text')
+    op.drop_column('documents', 'last_completed_batch')
+    op.drop_column('documents', 'indexed_chunk_count')
+    op.drop_column('documents', 'source_path')
@@ -0,0 +1,97 @@
+import os
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+
+from sqlalchemy import update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from models import AnswerCacheEntry, CorpusVersion
+
+# --- Answer cache settings ---
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+# Cosine similarity a new query needs with a cached one to reuse its answer.
+ANSWER_CACHE_SIMILARITY_THRESHOLD = float(os.getenv("ANSWER_CACHE_SIMILARITY_THRESHOLD", 0.95))
+ANSWER_CACHE_TTL_HOURS = int(os.getenv("ANSWER_CACHE_TTL_HOURS", 24))
+
+
+def get_corpus_version(collection: str, db: Session) -> int:
+    """Returns the current corpus version of a collection (0 if it was never bumped)."""
+    version = db.query(CorpusVersion.version).filter(CorpusVersion.collection == collection).scalar()
+    return version or 0
+
+
+def bump_corpus_version(collection: str, db: Session) -> None:
+    """
+    Marks a collection's corpus as changed, which invalidates every cached answer for it.
+    The caller is responsible for committing, so the bump lands in the same transaction
+    as the document change that caused it.
+    """
+    stmt = insert(CorpusVersion).values(collection=collection, version=1)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[CorpusVersion.collection],
+        set_={"version": CorpusVersion.version + 1},
+    )
+    db.execute(stmt)
+    # Entries from older versions can never be served again.
+    db.query(AnswerCacheEntry).filter(AnswerCacheEntry.collection == collection).delete(synchronize_session=False)
+
+
+def lookup_cached_answer(
+    query_embedding: List[float], collection: str, corpus_version: int, db: Session
+) -> Optional[Tuple[int, str]]:
+    """
+    Returns (entry_id, answer) for the most similar earlier query, if it is similar enough.
+    Pass entry_id to record_cache_hit when the answer is actually used.
+    """
+    if not query_embedding:
+        return None
+
+    distance = AnswerCacheEntry.query_embedding.cosine_distance(query_embedding)
+    cutoff = datetime.now(timezone.utc) - timedelta(hours=ANSWER_CACHE_TTL_HOURS)
+    row = (
+        db.query(AnswerCacheEntry.id, AnswerCacheEntry.answer, distance.label("distance"))
+        .filter(
+            AnswerCacheEntry.collection == collection,
+            AnswerCacheEntry.corpus_version == corpus_version,
+            AnswerCacheEntry.created_at > cutoff,
+        )
+        .order_by(distance)
+        .limit(1)
+        .first()
+    )
+    if row is None or 1 - row.distance < ANSWER_CACHE_SIMILARITY_THRESHOLD:
+        return None
+    return row.id, row.answer
+
+
+def record_cache_hit(entry_id: int, db: Session) -> None:
+    """Increments an entry's hit counter. The caller commits."""
+    db.execute(
+        update(AnswerCacheEntry)
+        .where(AnswerCacheEntry.id == entry_id)
+        .values(hit_count=AnswerCacheEntry.hit_count + 1)
+    )
+
+
+def store_cached_answer(
+    query_text: str, query_embedding: List[float], answer: str, collection: str, corpus_version: int, db: Session
+) -> None:
+    """
+    Caches an answer. corpus_version must be the version read before retrieval ran.
+    The caller commits (normally together with the chat turn, see rag_chat.commit_chat_turn).
+    """
+    if not query_embedding or not answer:
+        return
+    cutoff = datetime.now(timezone.utc) - timedelta(hours=ANSWER_CACHE_TTL_HOURS)
+    db.query(AnswerCacheEntry).filter(
+        AnswerCacheEntry.collection == collection,
+        AnswerCacheEntry.created_at <= cutoff,
+    ).delete(synchronize_session=False)
+    db.add(AnswerCacheEntry(
+        collection=collection,
+        corpus_version=corpus_version,
+        query_text=query_text,
+        query_embedding=query_embedding,
+        answer=answer,
+    ))
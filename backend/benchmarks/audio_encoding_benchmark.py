@@ -0,0 +1,85 @@
+"""
+Compares the transcription audio encoding profiles on real recordings: file size, bitrate,
+encode time and, with --transcribe, how close each profile's transcript is to the reference
+profile's (character-level similarity, 1.00 = identical). Run from backend/:
+
+    python benchmarks/audio_encoding_benchmark.py meeting.m4a                   # size and encode time only
+    python benchmarks/audio_encoding_benchmark.py meeting.m4a --seconds 120
+    python benchmarks/audio_encoding_benchmark.py meeting.m4a --transcribe      # needs GEMINI_API_KEY and the worker's environment
+"""
+import argparse
+import difflib
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def encode(source: Path, profile: dict, seconds: float, output: Path) -> float:
+    """Encodes the first `seconds` of source with the profile; returns the wall time taken."""
+    started = time.perf_counter()
+    subprocess.run(
+        ["ffmpeg", "-y", "-t", str(seconds), "-i", str(source), "-vn", *profile["args"], str(output)],
+        check=True, capture_output=True, text=True,
+    )
+    return time.perf_counter() - started
+
+
+def similarity(reference: str, text: str) -> float:
+    normalise = lambda value: " ".join(value.split())
+    return difflib.SequenceMatcher(None, normalise(reference), normalise(text), autojunk=False).ratio()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("audio", type=Path, nargs="+")
+    parser.add_argument("--profiles", help="comma separated, default all profiles")
+    parser.add_argument("--reference", default="mp3_high", help="profile the others are compared with")
+    parser.add_argument("--seconds", type=float, default=600, help="length of audio to encode, one segment by default")
+    parser.add_argument("--transcribe", action="store_true", help="also transcribe each encoding with Gemini")
+    args = parser.parse_args()
+
+    # tasks needs the worker's environment (database and Gemini settings) to import
+    import tasks
+
+    profiles = tasks.AUDIO_ENCODING_PROFILES
+    names = [name.strip() for name in args.profiles.split(",")] if args.profiles else list(profiles)
+    if args.reference not in names:
+        names.insert(0, args.reference)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        for source in args.audio:
+            results = {}
+            for name in names:
+                profile = profiles[name]
+                output = Path(workdir) / f"{source.stem}_{name}{profile['extension']}"
+                encode_seconds = encode(source, profile, args.seconds, output)
+                results[name] = {
+                    "size": output.stat().st_size,
+                    "duration": tasks.probe_duration_seconds(output) or args.seconds,
+                    "encode_seconds": encode_seconds,
+                    "transcript": (
+                        tasks.transcribe_segment(output, profile["mime_type"], f"benchmark_{output.name}")
+                        if args.transcribe else None
+                    ),
+                }
+
+            reference = results[args.reference]
+            print(f"{source.name}: first {reference['duration']:.0f}s, reference={args.reference}")
+            print(f"{'profile':<14}{'size KB':>10}{'kbps':>8}{'vs ref':>8}{'encode s':>10}{'similarity':>12}")
+            for name, result in results.items():
+                kbps = result["size"] * 8 / 1000 / result["duration"]
+                ratio = reference["size"] / max(1, result["size"])
+                similar = f"{similarity(reference['transcript'], result['transcript']):.2f}" if args.transcribe else "-"
+                print(
+                    f"{name:<14}{result['size'] / 1024:>10.0f}{kbps:>8.0f}{ratio:>7.1f}x"
+                    f"{result['encode_seconds']:>10.2f}{similar:>12}"
+                )
+            print()
+
+
+if __name__ == "__main__":
+    main()
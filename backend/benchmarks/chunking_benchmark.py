@@ -0,0 +1,112 @@
+"""
+Compares chunking strategies on a fixture corpus: chunk count, embedding cost and recall@k.
+
+A query counts as answered if one of its top-k retrieved chunks contains the query's
+expected answer text. Run from backend/:
+
+    python benchmarks/chunking_benchmark.py                      # Gemini embeddings (needs GEMINI_API_KEY)
+    python benchmarks/chunking_benchmark.py --embedder hashing   # offline, character n-gram vectors
+    python benchmarks/chunking_benchmark.py --chunk-size 600 --k 3
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import chunking  # noqa: E402
+from chunking import CHUNKERS, chunk_document, clean_text, estimate_tokens  # noqa: E402
+
+DEFAULT_CORPUS = Path(__file__).resolve().parent / "fixtures" / "chunking_corpus.json"
+# gemini-embedding-001 list price, USD per 1M input tokens
+EMBED_PRICE_PER_MILLION_TOKENS = float(os.getenv("EMBED_PRICE_PER_MILLION_TOKENS", 0.15))
+
+
+def hashing_embed(texts, dim=768):
+    """Offline stand-in for the embedding API: hashed character 3-grams, L2-normalised."""
+    vectors = np.zeros((len(texts), dim), dtype=np.float32)
+    for row, text in enumerate(texts):
+        text = f"  {clean_text(text).lower()}  "
+        for i in range(len(text) - 2):
+            bucket = int.from_bytes(hashlib.blake2b(text[i:i + 3].encode("utf-8"), digest_size=4).digest(), "little")
+            vectors[row, bucket % dim] += 1.0
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-9)
+
+
+def gemini_embedder():
+    from embedding_engine import EmbeddingEngine
+
+    documents = EmbeddingEngine(task_type="RETRIEVAL_DOCUMENT")
+    queries = EmbeddingEngine(task_type="RETRIEVAL_QUERY")
+
+    def embed(texts, is_query=False):
+        vectors = np.asarray((queries if is_query else documents).embed(texts), dtype=np.float32)
+        return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-9)
+
+    return embed
+
+
+def run_strategy(name, corpus, embed, k):
+    chunks = []
+    for document in corpus["documents"]:
+        strategy = None if name == "configured" else name
+        chunks.extend(chunk_document([document["text"]], document["document_type"], strategy=strategy))
+
+    tokens = sum(estimate_tokens(chunk) for chunk in chunks)
+    chunk_vectors = embed(chunks)
+    query_vectors = embed([q["query"] for q in corpus["queries"]], is_query=True)
+    scores = query_vectors @ chunk_vectors.T
+
+    hits = 0
+    for query, row in zip(corpus["queries"], scores):
+        top = np.argsort(-row)[:k]
+        answer = clean_text(query["answer"])
+        hits += any(answer in chunks[i] for i in top)
+
+    return {
+        "strategy": name,
+        "chunks": len(chunks),
+        "avg_tokens": tokens / max(1, len(chunks)),
+        "tokens": tokens,
+        "cost_usd": tokens / 1_000_000 * EMBED_PRICE_PER_MILLION_TOKENS,
+        "recall": hits / len(corpus["queries"]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", type=Path, default=DEFAULT_CORPUS)
+    parser.add_argument("--strategies", default=",".join([*CHUNKERS, "configured"]),
+                        help="comma separated; 'configured' uses CHUNKING_STRATEGIES per document_type")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--embedder", choices=["gemini", "hashing"], default="gemini")
+    parser.add_argument("--chunk-size", type=int, help="override CHUNK_SIZE (characters)")
+    parser.add_argument("--token-size", type=int, help="override CHUNK_TOKEN_SIZE")
+    args = parser.parse_args()
+
+    if args.chunk_size:
+        chunking.CHUNK_SIZE = args.chunk_size
+    if args.token_size:
+        chunking.CHUNK_TOKEN_SIZE = args.token_size
+
+    corpus = json.loads(args.corpus.read_text(encoding="utf-8"))
+    embed = gemini_embedder() if args.embedder == "gemini" else (lambda texts, is_query=False: hashing_embed(texts))
+
+    print(f"{len(corpus['documents'])} documents, {len(corpus['queries'])} queries, embedder={args.embedder}, k={args.k}")
+    print(f"{'strategy':<14}{'chunks':>8}{'avg tok':>9}{'tokens':>9}{'cost $':>11}{f'recall@{args.k}':>11}")
+    for name in args.strategies.split(","):
+        result = run_strategy(name.strip(), corpus, embed, args.k)
+        print(
+            f"{result['strategy']:<14}{result['chunks']:>8}{result['avg_tokens']:>9.0f}{result['tokens']:>9}"
+            f"{result['cost_usd']:>11.6f}{result['recall']:>11.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+import hashlib
+import os
+import re
+import unicodedata
+from typing import Dict, Iterable, List
+
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from embedding_engine import EMBED_DIMENSIONALITY, EMBED_MODEL
+from models import ChunkEmbeddingCacheEntry
+
+# --- Chunk embedding cache settings ---
+CHUNK_EMBEDDING_CACHE_ENABLED = os.getenv("CHUNK_EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+
+
+def chunk_content_hash(text: str, task_type: str = "RETRIEVAL_DOCUMENT") -> str:
+    """
+    Cache key of a chunk: sha256 over the normalized text and everything else that changes
+    the vector (model, task type, dimension), so a model upgrade never serves stale vectors.
+    """
+    normalized = re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+    key = f"{EMBED_MODEL}\x1f{task_type}\x1f{EMBED_DIMENSIONALITY}\x1f{normalized}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def lookup_cached_embeddings(hashes: Iterable[str], db: Session) -> Dict[str, List[float]]:
+    """Returns {hash: embedding} for every hash that is cached, in a single query."""
+    hashes = list(set(hashes))
+    if not hashes:
+        return {}
+    rows = (
+        db.query(ChunkEmbeddingCacheEntry.content_hash, ChunkEmbeddingCacheEntry.embedding)
+        .filter(ChunkEmbeddingCacheEntry.content_hash.in_(hashes))
+        .all()
+    )
+    return {row.content_hash: row.embedding for row in rows}
+
+
+def store_cached_embeddings(embeddings: Dict[str, List[float]], db: Session) -> None:
+    """Adds {hash: embedding} entries; concurrent ingestions may race, so conflicts are ignored. The caller commits."""
+    if not embeddings:
+        return
+    stmt = insert(ChunkEmbeddingCacheEntry).values([
+        {"content_hash": content_hash, "embedding": embedding}
+        for content_hash, embedding in embeddings.items()
+    ])
+    db.execute(stmt.on_conflict_do_nothing(index_elements=[ChunkEmbeddingCacheEntry.content_hash]))
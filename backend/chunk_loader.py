@@ -0,0 +1,78 @@
+import io
+import json
+import os
+import struct
+from typing import List
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from models import DocumentChunk
+
+# --- Bulk loader settings ---
+CHUNK_COPY_ENABLED = os.getenv("CHUNK_COPY_ENABLED", "true").lower() == "true"
+
+# Binary COPY framing, see https://www.postgresql.org/docs/current/sql-copy.html#id-1.9.3.55.9.4
+_PGCOPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack("!ii", 0, 0)
+_PGCOPY_TRAILER = struct.pack("!h", -1)
+_NULL_FIELD = struct.pack("!i", -1)
+_COPY_COLUMNS = ("document_id", "content", "embedding", "chunk_metadata")
+_COPY_SQL = f"COPY document_chunks ({', '.join(_COPY_COLUMNS)}) FROM STDIN WITH (FORMAT binary)"
+
+
+def _field(data: bytes) -> bytes:
+    return struct.pack("!i", len(data)) + data
+
+
+def encode_vector(embedding) -> bytes:
+    """pgvector's binary wire format (vector_recv): uint16 dim, uint16 unused, big-endian float4s."""
+    values = np.asarray(embedding, dtype=">f4")
+    return struct.pack("!HH", values.shape[0], 0) + values.tobytes()
+
+
+def encode_chunk_rows(rows: List[dict]) -> bytes:
+    """Encodes chunk rows (dicts with the _COPY_COLUMNS keys) as one binary COPY stream."""
+    buffer = io.BytesIO()
+    buffer.write(_PGCOPY_HEADER)
+    tuple_header = struct.pack("!h", len(_COPY_COLUMNS))
+    for row in rows:
+        buffer.write(tuple_header)
+        buffer.write(_field(struct.pack("!i", row["document_id"])))
+        buffer.write(_field(row["content"].encode("utf-8")))
+        embedding = row.get("embedding")
+        buffer.write(_NULL_FIELD if embedding is None else _field(encode_vector(embedding)))
+        metadata = row.get("chunk_metadata")
+        # json (not jsonb) columns take plain JSON text in binary format
+        buffer.write(_NULL_FIELD if metadata is None else _field(json.dumps(metadata).encode("utf-8")))
+    buffer.write(_PGCOPY_TRAILER)
+    return buffer.getvalue()
+
+
+def _copy_cursor(db: Session):
+    """A cursor of the session's own connection if it supports COPY (psycopg2), else None."""
+    if not CHUNK_COPY_ENABLED:
+        return None
+    dbapi_connection = db.connection().connection
+    cursor = dbapi_connection.cursor()
+    if not hasattr(cursor, "copy_expert"):
+        cursor.close()
+        return None
+    return cursor
+
+
+def write_document_chunks(rows: List[dict], db: Session) -> None:
+    """
+    Inserts document chunks with binary COPY on the session's connection, so the rows are part
+    of the session's transaction and are committed with it. Falls back to bulk_save_objects
+    when the driver can't COPY. The caller commits.
+    """
+    if not rows:
+        return
+    cursor = _copy_cursor(db)
+    if cursor is None:
+        db.bulk_save_objects([DocumentChunk(**row) for row in rows])
+        return
+    try:
+        cursor.copy_expert(_COPY_SQL, io.BytesIO(encode_chunk_rows(rows)))
+    finally:
+        cursor.close()
@@ -0,0 +1,308 @@
+import os
+import re
+import unicodedata
+import zlib
+from math import ceil
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# --- Chunking settings ---
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", 1000)) # characters
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", 100))
+CHUNK_TOKEN_SIZE = int(os.getenv("CHUNK_TOKEN_SIZE", 256)) # estimated tokens, see estimate_tokens
+CHUNK_TOKEN_OVERLAP = int(os.getenv("CHUNK_TOKEN_OVERLAP", 32))
+
+# Strategy per document_type; override with e.g. CHUNKING_STRATEGIES="general_document=sentence".
+# Meetings documents are re-indexed incrementally, so they need the edit-stable speaker_turn strategy.
+# Other documents keep the fixed windows until benchmarks/chunking_benchmark.py shows a gain on a real corpus.
+DEFAULT_CHUNKING_STRATEGY = "fixed"
+CHUNKING_STRATEGIES = {
+    "full_transcript": "speaker_turn",
+    "meeting_minutes": "speaker_turn",
+}
+for _entry in filter(None, os.getenv("CHUNKING_STRATEGIES", "").split(",")):
+    _document_type, _, _strategy = _entry.partition("=")
+    CHUNKING_STRATEGIES[_document_type.strip()] = _strategy.strip()
+
+
+# 1. CLEANING FUNCTION
+def clean_text(text):
+    if not text:
+        return ""
+    # Remove null bytes or non-printable characters
+    text = text.replace('\x00', '')
+    # Replace multiple spaces/newlines with a single space
+    text = re.sub(r'\s+', ' ', text)
+    # Strip leading/trailing whitespace
+    return text.strip()
+
+# 2. SPLIT FUNCTION
+def split_text(text, chunk_size=1000, overlap=100):
+    chunks = []
+    start = 0
+    text_len = len(text)
+    while start < text_len:
+        end = min(start + chunk_size, text_len)
+        chunks.append(text[start:end])
+        if end == text_len: break
+        start += (chunk_size - overlap)
+    return chunks
+
+# Streaming variants of the two functions above. Fed the same text in pieces they produce
+# exactly the same chunks as split_text(clean_text(text)), without ever holding the whole text.
+def iter_clean_text(pieces: Iterable[str]) -> Iterator[str]:
+    """Streaming clean_text: strips null bytes and collapses whitespace runs across piece boundaries."""
+    started = False
+    pending_space = False
+    for piece in pieces:
+        piece = re.sub(r'\s+', ' ', piece.replace('\x00', '')) if piece else ""
+        if piece.startswith(' '):
+            pending_space = True
+            piece = piece[1:]
+        if not piece:
+            continue
+        trailing_space = piece.endswith(' ')
+        if trailing_space:
+            piece = piece[:-1]
+        if started and pending_space:
+            yield ' '
+        yield piece
+        started = True
+        pending_space = trailing_space
+
+def iter_chunks(pieces: Iterable[str], chunk_size=1000, overlap=100) -> Iterator[str]:
+    """Streaming split_text: keeps at most one chunk plus one piece of text buffered."""
+    buffer = ""
+    for piece in pieces:
+        buffer += piece
+        # Only emit once more text follows the window, so the final chunk matches split_text.
+        while len(buffer) > chunk_size:
+            yield buffer[:chunk_size]
+            buffer = buffer[chunk_size - overlap:]
+    if buffer:
+        yield buffer
+
+def estimate_tokens(text):
+    """
+    Cheap token estimate used for context budgeting: ~4 characters per token for ASCII
+    text, ~2 for other scripts (Burmese splits into many more tokens per character).
+    """
+    if not text:
+        return 0
+    ascii_chars = sum(1 for c in text if ord(c) < 128)
+    return ceil(ascii_chars / 4 + (len(text) - ascii_chars) / 2)
+
+
+# --- Units: sentences, lines, speaker turns ---
+# Sentence ends: ./!/? (plus closing quotes/brackets) followed by whitespace, the Burmese
+# full stop "။", or a paragraph break.
+SENTENCE_END = re.compile(r'[.!?]+["\'”’)\]]*\s+|။\s*|\n\s*\n')
+# "Speaker 1:", "S>", "Ko Aung:", "**Person 2:**" at the start of a line.
+SPEAKER_LABEL = re.compile(r'^\s*(?:\*\*)?[^\W\d][^:>\n]{0,40}?(?:\*\*)?\s*[:>](?:\*\*)?\s')
+
+def _is_safe_cut(text: str, i: int) -> bool:
+    """True if text can be cut before index i without splitting a syllable/grapheme."""
+    if i <= 0 or i >= len(text):
+        return True
+    # Combining marks (Burmese vowel signs, medials, asat) belong to the preceding character;
+    # a consonant after the virama (U+1039) is stacked under the previous one, and a consonant
+    # killed by asat (U+103A) closes the previous syllable.
+    if unicodedata.category(text[i]).startswith("M") or text[i - 1] == "\u1039":
+        return False
+    return text[i + 1:i + 2] != "\u103a"
+
+def split_long_unit(text: str, max_size: int, size_fn: Callable[[str], int] = len) -> List[str]:
+    """
+    Splits text into pieces of at most ~max_size (measured with size_fn), preferring
+    whitespace and never cutting inside a syllable.
+    """
+    chars_per_unit = len(text) / max(1, size_fn(text))
+    window = max(1, int(max_size * chars_per_unit))
+    pieces = []
+    start = 0
+    while len(text) - start > window:
+        end = start + window
+        space = text.rfind(" ", start + int(window * 0.8), end)
+        if space > start:
+            end = space
+        else:
+            while end > start + 1 and not _is_safe_cut(text, end):
+                end -= 1
+        pieces.append(text[start:end].strip())
+        start = end
+    pieces.append(text[start:].strip())
+    return [piece for piece in pieces if piece]
+
+def iter_lines(pieces: Iterable[str]) -> Iterator[str]:
+    """Re-splits text pieces (pages, blocks) into lines."""
+    buffer = ""
+    for piece in pieces:
+        buffer += piece
+        lines = buffer.split("\n")
+        buffer = lines.pop()
+        yield from lines
+    if buffer:
+        yield buffer
+
+def iter_sentences(pieces: Iterable[str], max_length: int = 4 * CHUNK_SIZE) -> Iterator[str]:
+    """Cleaned sentences (or paragraph tails) from streamed text; unpunctuated runs are cut at max_length."""
+    buffer = ""
+    for piece in pieces:
+        buffer += piece
+        last = 0
+        for match in SENTENCE_END.finditer(buffer):
+            if match.end() == len(buffer):
+                break # the terminator may continue in the next piece
+            sentence = clean_text(buffer[last:match.end()])
+            if sentence:
+                yield sentence
+            last = match.end()
+        buffer = buffer[last:]
+        if len(buffer) > max_length:
+            yield from split_long_unit(clean_text(buffer), max_length)
+            buffer = ""
+    tail = clean_text(buffer)
+    if tail:
+        yield tail
+
+def iter_speaker_turns(lines: Iterable[str]) -> Iterator[str]:
+    """
+    Cleaned speaker turns: a line starting with a speaker label plus the unlabelled lines
+    that follow it. Text without labels (minutes, notes) comes out one line per unit.
+    """
+    turn = []
+    for line in lines:
+        if not line.strip():
+            continue
+        if turn and SPEAKER_LABEL.match(turn[0]) and not SPEAKER_LABEL.match(line):
+            turn.append(line)
+            continue
+        if turn:
+            yield clean_text(" ".join(turn))
+        turn = [line]
+    if turn:
+        yield clean_text(" ".join(turn))
+
+
+# --- Packing units into chunks ---
+# Chunkers yield (chunk, overlap_chars) pairs: overlap_chars is how many leading characters of
+# the chunk repeat the end of the previous chunk, so rag_chat.pack_context can merge neighbours
+# without guessing.
+def pack_units(
+    units: Iterable[str],
+    chunk_size: int,
+    overlap: int = 0,
+    size_fn: Callable[[str], int] = len,
+) -> Iterator[str]:
+    """
+    Greedily packs whole units into chunks of at most chunk_size (measured with size_fn),
+    repeating trailing units worth up to `overlap` at the start of the next chunk.
+    Units larger than a chunk are split with split_long_unit.
+    """
+    return (chunk for chunk, _ in pack_units_with_overlap(units, chunk_size, overlap, size_fn))
+
+def pack_units_with_overlap(
+    units: Iterable[str],
+    chunk_size: int,
+    overlap: int = 0,
+    size_fn: Callable[[str], int] = len,
+) -> Iterator[Tuple[str, int]]:
+    """pack_units, yielding (chunk, overlap_chars) pairs."""
+    current, size = [], 0
+    carried_chars = 0
+    for unit in units:
+        pieces = [unit] if size_fn(unit) <= chunk_size else split_long_unit(unit, chunk_size, size_fn)
+        for piece in pieces:
+            piece_size = size_fn(piece)
+            if current and size + piece_size > chunk_size:
+                yield " ".join(current), carried_chars
+                carried, carried_size = [], 0
+                for previous in reversed(current):
+                    previous_size = size_fn(previous)
+                    if carried_size + previous_size > overlap or carried_size + previous_size + piece_size > chunk_size:
+                        break
+                    carried.insert(0, previous)
+                    carried_size += previous_size
+                current, size = carried, carried_size
+                carried_chars = len(" ".join(carried))
+            current.append(piece)
+            size += piece_size
+    if current:
+        yield " ".join(current), carried_chars
+
+def pack_units_content_defined(units: Iterable[str], chunk_size: int) -> Iterator[str]:
+    """
+    Edit-stable packing: units are added until the chunk holds at least chunk_size / 2
+    characters and ends on an "anchor" unit (chosen by a hash of the unit itself), or would
+    exceed 2 * chunk_size. Because cut points depend on content rather than on absolute
+    offsets, an edit only changes the chunks around it and later chunks come out identical,
+    which is what lets rag_pipeline.reindex_document_pipeline skip re-embedding them.
+    """
+    min_size, max_size = chunk_size // 2, chunk_size * 2
+    current, size = [], 0
+    for unit in units:
+        pieces = [unit] if len(unit) <= max_size else split_long_unit(unit, chunk_size)
+        for piece in pieces:
+            if current and size + len(piece) > max_size:
+                yield " ".join(current)
+                current, size = [], 0
+            current.append(piece)
+            size += len(piece) + 1
+            if size >= min_size and zlib.crc32(piece.encode("utf-8")) % 4 == 0:
+                yield " ".join(current)
+                current, size = [], 0
+    if current:
+        yield " ".join(current)
+
+
+# --- Strategies ---
+# Each strategy yields (chunk, overlap_chars) pairs, see pack_units_with_overlap.
+def chunk_fixed(pieces: Iterable[str]) -> Iterator[Tuple[str, int]]:
+    """Fixed CHUNK_SIZE character windows over the cleaned text (the original behaviour)."""
+    previous = None
+    for chunk in iter_chunks(iter_clean_text(pieces), CHUNK_SIZE, CHUNK_OVERLAP):
+        # Every window after the first starts with the last CHUNK_OVERLAP characters of the one before.
+        yield chunk, 0 if previous is None else min(CHUNK_OVERLAP, len(previous))
+        previous = chunk
+
+def chunk_sentences(pieces: Iterable[str]) -> Iterator[Tuple[str, int]]:
+    """Whole sentences packed up to CHUNK_SIZE characters; paragraph breaks end sentences."""
+    return pack_units_with_overlap(iter_sentences(pieces), CHUNK_SIZE, CHUNK_OVERLAP)
+
+def chunk_speaker_turns(pieces: Iterable[str]) -> Iterator[Tuple[str, int]]:
+    """Whole speaker turns (or lines), packed edit-stably around CHUNK_SIZE characters, without overlap."""
+    return ((chunk, 0) for chunk in pack_units_content_defined(iter_speaker_turns(iter_lines(pieces)), CHUNK_SIZE))
+
+def chunk_tokens(pieces: Iterable[str]) -> Iterator[Tuple[str, int]]:
+    """Whole sentences packed up to CHUNK_TOKEN_SIZE estimated tokens."""
+    return pack_units_with_overlap(iter_sentences(pieces), CHUNK_TOKEN_SIZE, CHUNK_TOKEN_OVERLAP, size_fn=estimate_tokens)
+
+CHUNKERS: Dict[str, Callable[[Iterable[str]], Iterator[Tuple[str, int]]]] = {
+    "fixed": chunk_fixed,
+    "sentence": chunk_sentences,
+    "speaker_turn": chunk_speaker_turns,
+    "token": chunk_tokens,
+}
+
+def get_chunking_strategy(document_type: Optional[str]) -> str:
+    strategy = CHUNKING_STRATEGIES.get(document_type, DEFAULT_CHUNKING_STRATEGY)
+    if strategy not in CHUNKERS:
+        raise ValueError(f"Unknown chunking strategy '{strategy}' for document type '{document_type}'")
+    return strategy
+
+def chunk_document(pieces: Iterable[str], document_type: Optional[str] = None, strategy: Optional[str] = None) -> Iterator[str]:
+    """Non-blank chunks of streamed document text, using the strategy configured for document_type."""
+    return (chunk for chunk, _ in chunk_document_with_overlap(pieces, document_type, strategy))
+
+def chunk_document_with_overlap(
+    pieces: Iterable[str], document_type: Optional[str] = None, strategy: Optional[str] = None
+) -> Iterator[Tuple[str, int]]:
+    """chunk_document, yielding (chunk, overlap_chars) pairs."""
+    chunker = CHUNKERS[strategy or get_chunking_strategy(document_type)]
+    skipped = False
+    for chunk, overlap_chars in chunker(pieces):
+        if not chunk.strip():
+            skipped = True
+            continue
+        # After a skipped blank chunk the overlap would refer to a chunk that isn't stored.
+        yield chunk, 0 if skipped else overlap_chars
+        skipped = False
@@ -0,0 +1,207 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import List, Optional
+
+import redis
+
+logger = logging.getLogger(__name__)
+
+# --- Cache settings ---
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+EMBEDDING_CACHE_LOCAL_SIZE = int(os.getenv("EMBEDDING_CACHE_LOCAL_SIZE", 1024))
+EMBEDDING_CACHE_REDIS_URL = os.getenv("EMBEDDING_CACHE_REDIS_URL", os.getenv("REDIS_URL", "redis://redis:6379/1"))
+EMBEDDING_CACHE_TTL_SECONDS = int(os.getenv("EMBEDDING_CACHE_TTL_SECONDS", 7 * 24 * 3600))
+EMBEDDING_CACHE_REDIS_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_REDIS_MAX_ENTRIES", 50000))
+# After a Redis error the shared tier is skipped for this long, so an outage doesn't add a timeout to every request.
+REDIS_RETRY_AFTER_SECONDS = 30
+# Hit/miss counters are kept in process and added to the shared Redis counters at most this often,
+# piggybacking on cache misses (which go to Redis anyway) so local hits stay free of network calls.
+STATS_FLUSH_SECONDS = 30
+
+
+def _pack(vector: List[float]) -> bytes:
+    return array("f", vector).tobytes()
+
+
+def _unpack(data: bytes) -> List[float]:
+    values = array("f")
+    values.frombytes(data)
+    return values.tolist()
+
+
+def _as_float32(vector: List[float]) -> tuple:
+    """The vector rounded to float32 as Redis stores it, so both tiers return identical values."""
+    return tuple(_unpack(_pack(vector)))
+
+
+class QueryEmbeddingCache:
+    """
+    Two-tier cache for query embeddings.
+
+    Tier 1 is an in-process LRU, tier 2 is Redis (shared by all API workers) with a TTL
+    and an upper bound on the number of entries. Both tiers hold float32 values and callers
+    get their own copy of a cached vector. Redis errors are logged and treated as misses so
+    the chat path never fails because of the cache.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        local_size: int = EMBEDDING_CACHE_LOCAL_SIZE,
+        redis_url: Optional[str] = EMBEDDING_CACHE_REDIS_URL,
+        ttl_seconds: int = EMBEDDING_CACHE_TTL_SECONDS,
+        redis_max_entries: int = EMBEDDING_CACHE_REDIS_MAX_ENTRIES,
+    ):
+        self.namespace = namespace
+        self.local_size = local_size
+        self.redis_url = redis_url
+        self.ttl_seconds = ttl_seconds
+        self.redis_max_entries = redis_max_entries
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        self._redis = None
+        self._redis_down_until = 0.0
+        self.stats = {"local_hits": 0, "redis_hits": 0, "misses": 0}
+        self._unflushed_stats = {"local_hits": 0, "redis_hits": 0, "misses": 0}
+        self._stats_flushed_at = time.time()
+
+    # --- Keys ---
+    def make_key(self, text: str) -> str:
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"{self.namespace}:{digest}"
+
+    @property
+    def _index_key(self) -> str:
+        # Sorted set of cached keys scored by last write time, used for size-based eviction.
+        return f"{self.namespace}:index"
+
+    @property
+    def _stats_key(self) -> str:
+        return f"{self.namespace}:stats"
+
+    def _get_redis(self):
+        if not self.redis_url or time.time() < self._redis_down_until:
+            return None
+        if self._redis is None:
+            self._redis = redis.Redis.from_url(self.redis_url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        return self._redis
+
+    def _redis_failed(self, e: Exception) -> None:
+        logger.warning(f"Embedding cache Redis tier unavailable, skipping it for {REDIS_RETRY_AFTER_SECONDS}s: {e}")
+        self._redis_down_until = time.time() + REDIS_RETRY_AFTER_SECONDS
+
+    def _count(self, stat: str) -> None:
+        with self._lock:
+            self.stats[stat] += 1
+            self._unflushed_stats[stat] += 1
+
+    def _flush_stats(self, client, force: bool = False) -> None:
+        """Adds the counters gathered since the last flush to the shared Redis counters."""
+        with self._lock:
+            if not force and time.time() - self._stats_flushed_at < STATS_FLUSH_SECONDS:
+                return
+            pending = {stat: count for stat, count in self._unflushed_stats.items() if count}
+            self._unflushed_stats = dict.fromkeys(self._unflushed_stats, 0)
+            self._stats_flushed_at = time.time()
+        if not pending:
+            return
+        try:
+            pipe = client.pipeline()
+            for stat, count in pending.items():
+                pipe.hincrby(self._stats_key, stat, count)
+            pipe.execute()
+        except redis.RedisError as e:
+            # Put the counts back so they go out with the next flush.
+            with self._lock:
+                for stat, count in pending.items():
+                    self._unflushed_stats[stat] += count
+            self._redis_failed(e)
+
+    # --- Public API ---
+    def get(self, text: str) -> Optional[List[float]]:
+        key = self.make_key(text)
+
+        with self._lock:
+            vector = self._local.get(key)
+            if vector is not None:
+                self._local.move_to_end(key)
+        if vector is not None:
+            self._count("local_hits")
+            return list(vector)
+
+        client = self._get_redis()
+        if client is not None:
+            try:
+                data = client.get(key)
+            except redis.RedisError as e:
+                self._redis_failed(e)
+                data = None
+            if data:
+                vector = tuple(_unpack(data))
+                self._set_local(key, vector)
+                self._count("redis_hits")
+                self._flush_stats(client)
+                return list(vector)
+
+        self._count("misses")
+        if client is not None and time.time() >= self._redis_down_until:
+            self._flush_stats(client)
+        return None
+
+    def set(self, text: str, vector: List[float]) -> None:
+        if not vector:
+            return
+        key = self.make_key(text)
+        self._set_local(key, _as_float32(vector))
+
+        client = self._get_redis()
+        if client is None:
+            return
+        try:
+            now = time.time()
+            pipe = client.pipeline()
+            pipe.set(key, _pack(vector), ex=self.ttl_seconds)
+            pipe.zadd(self._index_key, {key: now})
+            # Drop index entries whose keys have already expired through the TTL.
+            pipe.zremrangebyscore(self._index_key, 0, now - self.ttl_seconds)
+            pipe.zcard(self._index_key)
+            size = pipe.execute()[-1]
+            if size > self.redis_max_entries:
+                evicted = client.zpopmin(self._index_key, size - self.redis_max_entries)
+                if evicted:
+                    client.delete(*[member for member, _ in evicted])
+        except redis.RedisError as e:
+            self._redis_failed(e)
+
+    def get_stats(self) -> dict:
+        """Returns this process's counters plus the shared counters from Redis, if reachable."""
+        with self._lock:
+            result = {"local": dict(self.stats), "local_entries": len(self._local)}
+        client = self._get_redis()
+        if client is not None:
+            self._flush_stats(client, force=True)
+            client = self._get_redis()
+        if client is not None:
+            try:
+                shared = client.hgetall(self._stats_key)
+                result["shared"] = {k.decode(): int(v) for k, v in shared.items()}
+                result["shared_entries"] = client.zcard(self._index_key)
+            except redis.RedisError as e:
+                self._redis_failed(e)
+        return result
+
+    def _set_local(self, key: str, vector: tuple) -> None:
+        with self._lock:
+            self._local[key] = vector
+            self._local.move_to_end(key)
+            while len(self._local) > self.local_size:
+                self._local.popitem(last=False)
+
+
+# Shared instance for RETRIEVAL_QUERY embeddings (see rag_chat.generate_embedding).
+query_embedding_cache = QueryEmbeddingCache(namespace="emb:query:gemini-embedding-001:768")
@@ -0,0 +1,223 @@
+import logging
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+# --- Embedding engine settings ---
+EMBED_MODEL = "gemini-embedding-001"
+EMBED_DIMENSIONALITY = 768
+EMBED_MAX_BATCH_SIZE = 100 # batchEmbedContents accepts at most 100 requests
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", 4))
+# 0 disables client-side rate limiting.
+EMBED_REQUESTS_PER_MINUTE = int(os.getenv("EMBED_REQUESTS_PER_MINUTE", 100))
+EMBED_TIMEOUT_SECONDS = float(os.getenv("EMBED_TIMEOUT_SECONDS", 60))
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", 5))
+EMBED_BACKOFF_BASE_SECONDS = float(os.getenv("EMBED_BACKOFF_BASE_SECONDS", 1))
+EMBED_BACKOFF_MAX_SECONDS = float(os.getenv("EMBED_BACKOFF_MAX_SECONDS", 60))
+
+BATCH_EMBED_URL = f"https://generativelanguage.googleapis.com/v1beta/models/{EMBED_MODEL}:batchEmbedContents"
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+# Phrases Gemini uses in 400 responses when a request is over its size limits.
+PAYLOAD_LIMIT_PATTERN = re.compile(r"payload size|too large|exceeds the limit|at most \d+ requests", re.IGNORECASE)
+
+
+class PayloadTooLargeError(Exception):
+    """A batch was rejected for its size; it has to be split."""
+
+
+class RateLimiter:
+    """
+    Spaces request starts evenly to stay under a requests-per-minute budget, across all
+    threads of the process. pause() pushes every caller back, e.g. after a 429.
+    """
+
+    def __init__(self, requests_per_minute: int):
+        self.interval = 60.0 / requests_per_minute if requests_per_minute > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def acquire(self) -> None:
+        with self._lock:
+            slot = max(time.monotonic(), self._next_slot)
+            self._next_slot = slot + self.interval
+        delay = slot - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def pause(self, seconds: float) -> None:
+        with self._lock:
+            self._next_slot = max(self._next_slot, time.monotonic() + seconds)
+
+
+def _retry_after_seconds(response: requests.Response) -> Optional[float]:
+    """Server-requested delay, from the Retry-After header or Gemini's RetryInfo detail."""
+    header = response.headers.get("Retry-After")
+    if header:
+        try:
+            return max(0.0, float(header))
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(header).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+    try:
+        details = response.json().get("error", {}).get("details", [])
+    except ValueError:
+        return None
+    for detail in details:
+        delay = detail.get("retryDelay") if isinstance(detail, dict) else None
+        if delay and delay.endswith("s"):
+            try:
+                return float(delay[:-1])
+            except ValueError:
+                pass
+    return None
+
+
+class EmbeddingEngine:
+    """
+    Embeds document chunks with batchEmbedContents.
+
+    Several batches are kept in flight (EMBED_CONCURRENCY threads) under a shared
+    requests-per-minute budget. Timeouts, 429s and 5xx responses are retried with
+    exponential backoff and jitter, honouring Retry-After. When a batch is rejected for its
+    size the engine halves its batch size, for this batch and all later ones.
+    """
+
+    def __init__(
+        self,
+        task_type: str = "RETRIEVAL_DOCUMENT",
+        concurrency: int = EMBED_CONCURRENCY,
+        requests_per_minute: int = EMBED_REQUESTS_PER_MINUTE,
+        max_retries: int = EMBED_MAX_RETRIES,
+        timeout: float = EMBED_TIMEOUT_SECONDS,
+    ):
+        self.task_type = task_type
+        self.concurrency = max(1, concurrency)
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.batch_size = EMBED_MAX_BATCH_SIZE
+        self.rate_limiter = RateLimiter(requests_per_minute)
+        self._session = requests.Session()
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="embed")
+            return self._executor
+
+    def _payload(self, texts: List[str]) -> dict:
+        request = {"model": f"models/{EMBED_MODEL}", "taskType": self.task_type, "output_dimensionality": EMBED_DIMENSIONALITY}
+        if self.task_type == "RETRIEVAL_DOCUMENT":
+            request["title"] = "Handbook Chunk" # Only valid for document embeddings
+        return {"requests": [dict(request, content={"parts": [{"text": text}]}) for text in texts]}
+
+    def _backoff(self, attempt: int) -> float:
+        delay = min(EMBED_BACKOFF_MAX_SECONDS, EMBED_BACKOFF_BASE_SECONDS * 2 ** attempt)
+        return random.uniform(delay / 2, delay)
+
+    def _post(self, texts: List[str]) -> List[List[float]]:
+        """One batchEmbedContents call, with retries for transient failures."""
+        api_key = os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            raise RuntimeError("GEMINI_API_KEY not found")
+
+        attempt = 0
+        while True:
+            self.rate_limiter.acquire()
+            try:
+                response = self._session.post(
+                    BATCH_EMBED_URL,
+                    params={"key": api_key},
+                    json=self._payload(texts),
+                    timeout=self.timeout,
+                )
+            except (requests.Timeout, requests.ConnectionError) as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+                logger.warning("Embedding request failed (%s), retrying in %.1fs", e, delay)
+            else:
+                if response.status_code == 200:
+                    return [item["values"] for item in response.json()["embeddings"]]
+                if response.status_code == 413 or (
+                    response.status_code == 400 and PAYLOAD_LIMIT_PATTERN.search(response.text)
+                ):
+                    raise PayloadTooLargeError(response.text)
+                if response.status_code not in RETRYABLE_STATUS_CODES or attempt >= self.max_retries:
+                    logger.error("Embedding request failed: %s", response.text)
+                    response.raise_for_status()
+                delay = self._backoff(attempt)
+                retry_after = _retry_after_seconds(response)
+                if retry_after is not None:
+                    delay = max(delay, retry_after)
+                if response.status_code == 429:
+                    # Quota is shared, so hold back the other in-flight batches as well.
+                    self.rate_limiter.pause(delay)
+                logger.warning("Embedding request got HTTP %s, retrying in %.1fs", response.status_code, delay)
+            time.sleep(delay)
+            attempt += 1
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """Embeds texts in order, in as many requests as the current batch size needs."""
+        embeddings = []
+        start = 0
+        while start < len(texts):
+            size = self.batch_size
+            batch = texts[start:start + size]
+            try:
+                embeddings.extend(self._post(batch))
+            except PayloadTooLargeError:
+                if len(batch) == 1:
+                    raise
+                with self._lock:
+                    self.batch_size = min(self.batch_size, max(1, len(batch) // 2))
+                logger.warning("Embedding batch of %d rejected as too large, batch size is now %d", len(batch), self.batch_size)
+                continue
+            start += len(batch)
+        return embeddings
+
+    def embed_batches(self, batches: Iterable[List[str]]) -> Iterator[Tuple[List[str], List[List[float]]]]:
+        """
+        Embeds a stream of batches with up to `concurrency` of them in flight and yields
+        (batch, embeddings) in input order. Batches are pulled from the iterable lazily.
+        """
+        executor = self._get_executor()
+        batches = iter(batches)
+        in_flight = deque()
+
+        def submit_next() -> bool:
+            batch = next(batches, None)
+            if batch is None:
+                return False
+            in_flight.append((batch, executor.submit(self.embed, batch)))
+            return True
+
+        for _ in range(self.concurrency):
+            if not submit_next():
+                break
+        try:
+            while in_flight:
+                batch, future = in_flight.popleft()
+                embeddings = future.result()
+                submit_next()
+                yield batch, embeddings
+        finally:
+            for _, future in in_flight:
+                future.cancel()
+
+
+# Shared engine for document ingestion, so its rate limit covers every ingestion in the process.
+document_embedder = EmbeddingEngine()
@@ -1,4 +1,4 @@
-from fastapi import FastAPI, Depends, HTTPException, status, File, UploadFile, BackgroundTasks, Query, Form
+from fastapi import FastAPI, Depends, HTTPException, status, File, UploadFile, Query, Form
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from models import Base, User, Role, Permission, Document, DocumentStatus, Chat, ChatMessage, MessageFeedback, TranscriptionJob, TranscriptionJobStatus # Added TranscriptionJob, TranscriptionJobStatus
@@ -6,7 +6,8 @@ from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 import os
 import re
-from datetime import datetime, timedelta
+import hashlib
+from datetime import datetime, timedelta, timezone
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from pydantic import BaseModel
@@ -26,8 +27,10 @@ from fastapi.responses import StreamingResponse # New import for streaming file
 from markdown_it import MarkdownIt
 
 
-# Import the RAG pipeline functions
-from rag_pipeline import ingest_document_pipeline
+# Document ingestion runs on the Celery ingestion queue
+from tasks import INGEST_UPLOAD_DIR, CELERY_QUEUE_SETTINGS, enqueue_document_ingestion, enqueue_document_ingestions
+# Transcription jobs are queued and started by a fair-share scheduler
+from transcription_scheduler import TRANSCRIBE_MAX_QUEUED_JOBS_PER_USER, count_open_jobs, dispatch_transcription_jobs
 
 from contextlib import asynccontextmanager
 
@@ -37,16 +40,9 @@ app = FastAPI()
 def startup_event():
     db = SessionLocal()
     try:
-        stale_jobs = db.query(TranscriptionJob).filter(
-            TranscriptionJob.status.in_([TranscriptionJobStatus.PENDING, TranscriptionJobStatus.PROCESSING])
-        ).all()
-        
-        if stale_jobs:
-            logging.info(f"Found {len(stale_jobs)} stale jobs on startup. Marking as FAILED.")
-            for job in stale_jobs:
-                job.status = TranscriptionJobStatus.FAILED
-                job.error_message = "Job failed due to a server restart."
-            db.commit()
+        # Running jobs belong to the workers, which outlive an API restart; the scheduler fails
+        # only those whose heartbeat stopped, and fills whatever slots are free.
+        dispatch_transcription_jobs(db)
     finally:
         db.close()
 
@@ -56,6 +52,7 @@ celery_app = Celery(
     broker=os.getenv("CELERY_BROKER_URL", "redis://redis:6379/0"),
     backend=os.getenv("CELERY_RESULT_BACKEND", "redis://redis:6379/0")
 )
+celery_app.conf.update(CELERY_QUEUE_SETTINGS)
 
 logging.basicConfig(level=logging.INFO)
 
@@ -78,6 +75,9 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 # Directory for uploaded audio files
 UPLOAD_DIR = Path("/app/uploads")
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+INGEST_UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+UPLOAD_CHUNK_SIZE = 1024 * 1024 # Uploads are written to disk 1 MB at a time
+INGEST_BATCH_MAX_FILES = int(os.getenv("INGEST_BATCH_MAX_FILES", 500))
 
 
 # Auth setup
@@ -126,6 +126,9 @@ class DocumentDisplay(BaseModel):
     upload_date: datetime
     status: DocumentStatus
     document_type: Optional[str] # Add this field
+    indexed_chunk_count: int = 0
+    progress_text: Optional[str] = None
+    error_message: Optional[str] = None
 
     class Config:
         from_attributes = True
@@ -197,6 +200,7 @@ class TranscriptionJobDetailDisplay(TranscriptionJobDisplay):
     meeting_minutes: Optional[str] = None
     meeting_name: Optional[str] = None # Added field
     error_message: Optional[str] = None
+    segment_offsets: Optional[List[dict]] = None
 
     class Config:
         from_attributes = True
@@ -212,6 +216,7 @@ class MinutesGenerationRequest(BaseModel):
 
 class TranscriptionIngestRequest(BaseModel):
     document_type: str # e.g., 'full_transcript', 'meeting_minutes'
+    incremental: bool = True # Re-index the job's existing document, re-embedding only changed chunks
 
 # Helper functions
 def get_db():
@@ -301,10 +306,50 @@ class IngestResponse(BaseModel):
     document_id: int
     filename: str
 
+def queue_document_ingestion(document: Document, file_path: Path, collection: str, db: Session, incremental: bool = False):
+    """Hands a saved upload to the ingestion workers; marks the document FAILED if it can't be queued."""
+    document.source_path = str(file_path)
+    document.progress_text = "Queued"
+    db.commit()
+    try:
+        enqueue_document_ingestion(document.id, str(file_path), collection, incremental)
+    except Exception as e:
+        logging.error(f"Failed to queue document {document.id} for ingestion: {e}")
+        document.status = DocumentStatus.FAILED
+        document.error_message = f"Could not be queued for ingestion: {e}" # The file is kept for a retry
+        db.commit()
+        raise HTTPException(status_code=503, detail="Ingestion queue is unavailable, please try again later.")
+
+class BatchIngestDocument(BaseModel):
+    document_id: int
+    filename: str
+    content_hash: str
+    size_bytes: int
+
+class BatchIngestSkipped(BaseModel):
+    filename: str
+    content_hash: str
+    document_id: Optional[int] = None # Existing document with the same content, if any
+
+class BatchIngestResponse(BaseModel):
+    message: str
+    documents: List[BatchIngestDocument]
+    skipped: List[BatchIngestSkipped] # Duplicates left out with skip_duplicates; nothing was queued for them
+
+async def save_upload_streamed(file: UploadFile, destination: Path):
+    """Writes an upload to disk in UPLOAD_CHUNK_SIZE pieces, hashing it on the way. Returns (sha256, size)."""
+    digest = hashlib.sha256()
+    size = 0
+    with open(destination, "wb") as buffer:
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            digest.update(chunk)
+            buffer.write(chunk)
+            size += len(chunk)
+    return digest.hexdigest(), size
+
 @app.post("/api/ingest", response_model=IngestResponse)
 async def ingest_document(
     file: UploadFile = File(...),
-    background_tasks: BackgroundTasks = BackgroundTasks(),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
@@ -325,20 +370,17 @@ async def ingest_document(
     # Save file temporarily
     # Create a unique filename to avoid collisions
     unique_filename = f"{new_document.id}_{uuid.uuid4()}_{file.filename}"
-    temp_file_path = Path("/tmp") / unique_filename
-    temp_file_path.parent.mkdir(parents=True, exist_ok=True) # Ensure /tmp exists within the container
+    temp_file_path = INGEST_UPLOAD_DIR / unique_filename # Shared with the ingestion workers
 
     try:
-        with open(temp_file_path, "wb") as buffer:
-            buffer.write(await file.read())
+        new_document.content_hash, _ = await save_upload_streamed(file, temp_file_path)
+        db.commit()
     except Exception as e:
         db.delete(new_document) # Rollback document creation
         db.commit()
         raise HTTPException(status_code=500, detail=f"Failed to save uploaded file: {e}")
 
-    # Add ingestion to background tasks
-    # Pass SessionLocal directly, as it will create a new session for the background task
-    background_tasks.add_task(ingest_document_pipeline, new_document.id, str(temp_file_path), SessionLocal(), collection="corporate")
+    queue_document_ingestion(new_document, temp_file_path, "corporate", db)
 
     return IngestResponse(
         message="Document received and processing started in background.",
@@ -346,6 +388,92 @@ async def ingest_document(
         filename=file.filename,
     )
 
+@app.post("/api/ingest/batch", response_model=BatchIngestResponse)
+async def ingest_documents_batch(
+    files: List[UploadFile] = File(...),
+    skip_duplicates: bool = Form(False),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """
+    Ingests many documents in one request. Each file is streamed to the shared uploads volume
+    while being hashed. With skip_duplicates, files whose content is already in the corporate
+    collection (or repeated in the batch) are not ingested and are listed under `skipped`.
+    The new Document rows are created in one transaction and all ingestions are queued together.
+    """
+    if not check_permission(current_user, "ingest_documents", db):
+        raise HTTPException(status_code=403, detail="Not enough permissions to ingest documents")
+    if len(files) > INGEST_BATCH_MAX_FILES:
+        raise HTTPException(status_code=400, detail=f"At most {INGEST_BATCH_MAX_FILES} files can be ingested per request.")
+
+    saved = [] # (filename, path, content_hash, size)
+    try:
+        for file in files:
+            filename = Path(file.filename or "upload").name
+            file_path = INGEST_UPLOAD_DIR / f"{uuid.uuid4()}_{filename}"
+            content_hash, size = await save_upload_streamed(file, file_path)
+            saved.append((filename, file_path, content_hash, size))
+    except Exception as e:
+        for _, file_path, _, _ in saved:
+            file_path.unlink(missing_ok=True)
+        raise HTTPException(status_code=500, detail=f"Failed to save uploaded file: {e}")
+
+    existing = {}
+    if skip_duplicates:
+        existing = dict(
+            db.query(Document.content_hash, Document.id)
+            .filter(
+                Document.collection == "corporate",
+                Document.content_hash.in_([content_hash for _, _, content_hash, _ in saved]),
+                Document.status != DocumentStatus.FAILED,
+            )
+            .all()
+        )
+
+    new_documents, skipped, seen = [], [], set()
+    for filename, file_path, content_hash, size in saved:
+        if skip_duplicates and (content_hash in existing or content_hash in seen):
+            skipped.append(BatchIngestSkipped(filename=filename, content_hash=content_hash, document_id=existing.get(content_hash)))
+            file_path.unlink(missing_ok=True)
+            continue
+        seen.add(content_hash)
+        document = Document(
+            filename=filename,
+            status=DocumentStatus.PENDING,
+            collection="corporate",
+            document_type="general_document",
+            content_hash=content_hash,
+            source_path=str(file_path),
+            progress_text="Queued",
+        )
+        new_documents.append((document, file_path, size))
+
+    db.add_all([document for document, _, _ in new_documents])
+    db.commit() # One transaction for all new documents
+
+    if new_documents:
+        try:
+            enqueue_document_ingestions([(document.id, str(file_path)) for document, file_path, _ in new_documents], "corporate")
+        except Exception as e:
+            logging.error(f"Failed to queue batch ingestion: {e}")
+            for document, _, _ in new_documents:
+                document.status = DocumentStatus.FAILED
+                document.error_message = f"Could not be queued for ingestion: {e}" # The file is kept for a retry
+            db.commit()
+            raise HTTPException(status_code=503, detail="Ingestion queue is unavailable, please try again later.")
+
+    message = f"{len(new_documents)} documents received and processing started in background."
+    if skip_duplicates:
+        message += f" {len(skipped)} duplicates skipped."
+    return BatchIngestResponse(
+        message=message,
+        documents=[
+            BatchIngestDocument(document_id=document.id, filename=document.filename, content_hash=document.content_hash, size_bytes=size)
+            for document, _, size in new_documents
+        ],
+        skipped=skipped,
+    )
+
 @app.post("/api/transcribe", response_model=TranscriptionJobDisplay)
 async def start_transcription(
     meeting_name: str = Form(...),
@@ -353,32 +481,12 @@ async def start_transcription(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
-    # --- Global Lock Implementation ---
-    # Check for any active job across all users
-    active_job = (
-        db.query(TranscriptionJob)
-        .filter(
-            TranscriptionJob.status.in_([TranscriptionJobStatus.PENDING, TranscriptionJobStatus.PROCESSING])
+    # Jobs are always queued; the scheduler starts them within the global and per-user limits.
+    if count_open_jobs(current_user.id, db) >= TRANSCRIBE_MAX_QUEUED_JOBS_PER_USER:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"You already have {TRANSCRIBE_MAX_QUEUED_JOBS_PER_USER} transcriptions queued or running. Please wait for one to finish.",
         )
-        .first()
-    )
-
-    if active_job:
-        # Check if the active job is stale (e.g., older than 30 minutes)
-        timeout_threshold = datetime.now(active_job.updated_at.tzinfo) - timedelta(minutes=45)
-        if active_job.updated_at < timeout_threshold:
-            # Job is stale, mark as failed and proceed
-            logging.warning(f"Found and failed stale job (ID: {active_job.id}) that was stuck in '{active_job.status.value}' state.")
-            active_job.status = TranscriptionJobStatus.FAILED
-            active_job.error_message = "Task timed out and was marked as failed."
-            db.commit()
-        else:
-            # Job is genuinely active, block new job creation
-            raise HTTPException(
-                status_code=status.HTTP_409_CONFLICT,
-                detail=f"Another user is currently using this transcription service. Please come back later.",
-            )
-    # --- End Global Lock ---
 
     # 1. Create a preliminary job entry to get an ID
     new_job = TranscriptionJob(
@@ -386,7 +494,7 @@ async def start_transcription(
         original_filename=file.filename,
         meeting_name=meeting_name, # Save the meeting name
         status=TranscriptionJobStatus.PENDING,
-        progress_text="File uploaded, awaiting processing.",
+        progress_text="Uploading file...",
     )
     db.add(new_job)
     db.commit()
@@ -396,11 +504,6 @@ async def start_transcription(
     file_extension = Path(file.filename).suffix
     saved_file_name = f"{new_job.id}_{uuid.uuid4()}{file_extension}"
     file_path = UPLOAD_DIR / saved_file_name
-    
-    # 3. Update the job with the generated filename
-    new_job.saved_file_name = saved_file_name
-    db.commit()
-    db.refresh(new_job)
 
     try:
         with open(file_path, "wb") as buffer:
@@ -412,11 +515,12 @@ async def start_transcription(
         db.commit()
         raise HTTPException(status_code=500, detail=f"Failed to save uploaded file: {e}")
 
-    # Trigger the Celery task here
-    from tasks import transcribe_audio_task # Import the task
-    task_result = transcribe_audio_task.delay(new_job.id, str(file_path))
-    new_job.celery_task_id = task_result.id # Store the Celery task ID
-    db.commit() # Commit the task ID to the database after dispatching
+    # 3. Update the job with the generated filename; from here on the scheduler may pick it up
+    new_job.saved_file_name = saved_file_name
+    new_job.progress_text = "File uploaded, awaiting processing."
+    db.commit()
+
+    dispatch_transcription_jobs(db)
     db.refresh(new_job)
 
     return new_job
@@ -597,6 +701,7 @@ def delete_transcription_job(
 
     db.delete(job)
     db.commit()
+    dispatch_transcription_jobs(db)
     return
 
 @app.post("/api/transcribe/jobs/{job_id}/cancel", response_model=TranscriptionJobDisplay)
@@ -629,7 +734,11 @@ def cancel_transcription_job(
 
     job.status = TranscriptionJobStatus.CANCELLED
     job.error_message = "Job cancelled by user."
+    job.finished_at = datetime.now(timezone.utc)
     db.commit()
+
+    # Start the next queued job and refresh the queue positions of the others
+    dispatch_transcription_jobs(db)
     db.refresh(job)
     
     return job
@@ -703,7 +812,6 @@ def sanitize_filename(name: str) -> str:
 async def ingest_transcription_document(
     job_id: int,
     request: TranscriptionIngestRequest,
-    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
@@ -731,10 +839,20 @@ async def ingest_transcription_document(
     if not content_to_ingest or not content_to_ingest.strip():
         raise HTTPException(status_code=400, detail=f"No {request.document_type} available for job {job_id} to ingest.")
 
+    # An edited transcript re-indexes the document it was ingested as, instead of creating a new one
+    existing_document = None
+    if request.incremental:
+        existing_document = db.query(Document).filter(
+            Document.source_transcription_id == job_id,
+            Document.document_type == request.document_type,
+            Document.collection == "meetings",
+        ).order_by(Document.id.desc()).first()
+        if existing_document and existing_document.status in (DocumentStatus.PENDING, DocumentStatus.INDEXING):
+            raise HTTPException(status_code=409, detail=f"The {request.document_type} of job {job_id} is already being ingested.")
+
     # Create a temporary file to hold the content for ingestion pipeline
     unique_filename = f"{job_id}_{uuid.uuid4()}_{filename}"
-    temp_file_path = Path("/tmp") / unique_filename
-    temp_file_path.parent.mkdir(parents=True, exist_ok=True) # Ensure /tmp exists within the container
+    temp_file_path = INGEST_UPLOAD_DIR / unique_filename # Shared with the ingestion workers
 
     try:
         with open(temp_file_path, "w", encoding="utf-8") as buffer:
@@ -742,6 +860,17 @@ async def ingest_transcription_document(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to create temporary file for ingestion: {e}")
 
+    if existing_document:
+        existing_document.filename = filename
+        existing_document.status = DocumentStatus.PENDING
+        db.commit()
+        queue_document_ingestion(existing_document, temp_file_path, "meetings", db, incremental=True)
+        return IngestResponse(
+            message=f"{request.document_type.replace('_', ' ').capitalize()} received and re-indexing started in background.",
+            document_id=existing_document.id,
+            filename=filename,
+        )
+
     # Create a document entry
     new_document = Document(
         filename=filename,
@@ -754,8 +883,7 @@ async def ingest_transcription_document(
     db.commit()
     db.refresh(new_document)
 
-    # Add ingestion to background tasks
-    background_tasks.add_task(ingest_document_pipeline, new_document.id, str(temp_file_path), SessionLocal(), collection="meetings")
+    queue_document_ingestion(new_document, temp_file_path, "meetings", db)
 
     return IngestResponse(
         message=f"{request.document_type.replace('_', ' ').capitalize()} received and processing started in background.",
@@ -843,10 +971,41 @@ def delete_document(document_id: int, current_user: User = Depends(get_current_u
     if document.source_transcription_id and document.document_type:
         logging.info(f"Deleting RAG document (ID: {document.id}, Type: {document.document_type}) from collection '{document.collection}' linked to Transcription Job ID: {document.source_transcription_id}")
 
+    source_path = document.source_path
     db.delete(document)
+    bump_corpus_version(document.collection, db) # Invalidate cached answers for this collection
     db.commit()
+    # Failed ingestions keep their source file for a retry
+    if source_path and os.path.exists(source_path):
+        os.remove(source_path)
     return
 
+@app.post("/api/documents/{document_id}/retry", response_model=IngestResponse)
+def retry_document_ingestion(document_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Re-queues a FAILED ingestion; it resumes after the last batch that was committed."""
+    if not check_permission(current_user, "ingest_documents", db):
+        raise HTTPException(status_code=403, detail="Not enough permissions to ingest documents")
+
+    document = db.query(Document).filter(Document.id == document_id).first()
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+    if document.status != DocumentStatus.FAILED:
+        raise HTTPException(status_code=409, detail=f"Only failed ingestions can be retried (status is {document.status.value}).")
+    if not document.source_path or not os.path.exists(document.source_path):
+        raise HTTPException(status_code=409, detail="The source file is no longer available; please upload the document again.")
+
+    # INDEXING tells the pipeline to resume from the checkpoint instead of starting over.
+    document.status = DocumentStatus.INDEXING
+    document.error_message = None
+    db.commit()
+    queue_document_ingestion(document, Path(document.source_path), document.collection, db)
+
+    return IngestResponse(
+        message=f"Ingestion re-queued; resuming after {document.indexed_chunk_count} indexed chunks.",
+        document_id=document.id,
+        filename=document.filename,
+    )
+
 @app.post("/vectors")
 def create_vector(vector: VectorCreate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     if not check_permission(current_user, "write_vectors", db):
@@ -969,6 +1128,9 @@ def update_user(user_id: int, user_update: UserUpdate, current_user: User = Depe
     return db_user
 
 import asyncio
+import json
+from dataclasses import dataclass
+import anyio
 from fastapi import FastAPI, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
@@ -976,48 +1138,196 @@ from sqlalchemy.orm import Session
 
 # Import RAG chat functions
 from rag_chat import (
-    get_or_create_chat,
-    save_message,
     get_chat_history,
+    load_chat_context,
+    commit_chat_turn,
     normalize_text,
-    generate_embedding,
-    perform_vector_search,
+    retrieve_chunks,
     construct_llm_prompt,
-    get_llm_response,
+    is_cacheable_response,
+    agenerate_embedding,
+    aget_llm_response,
+    astream_llm_response,
+    close_http_client,
+)
+from embedding_cache import query_embedding_cache
+from answer_cache import (
+    ANSWER_CACHE_ENABLED,
+    bump_corpus_version,
+    get_corpus_version,
+    lookup_cached_answer,
+    record_cache_hit,
+    store_cached_answer,
 )
 
-@app.post("/chat")
-def chat(
-    chat_request: ChatRequest,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Close the pooled Gemini HTTP client used by the chat endpoints
+    await close_http_client()
+
+def _build_chat_prompt(
+    user_query: str, query_embedding: List[float], history: list, collection: str,
+    use_answer_cache: bool, db: Session,
 ):
-    # 1. Get or create chat session
-    chat_session = get_or_create_chat(current_user.id, db, session_id=chat_request.session_id, collection="corporate")
+    """
+    DB work for retrieval. Returns (corpus_version, cache_hit, prompt, has_context), where
+    cache_hit is (entry_id, answer) from the answer cache and prompt is None in that case.
+    """
+    corpus_version = None
+    if use_answer_cache:
+        corpus_version = get_corpus_version(collection, db)
+        cache_hit = lookup_cached_answer(query_embedding, collection, corpus_version, db)
+        if cache_hit is not None:
+            return corpus_version, cache_hit, None, True
+
+    retrieved_chunks = retrieve_chunks(normalize_text(user_query), query_embedding, db, collection=collection)
+    prompt = construct_llm_prompt(user_query, retrieved_chunks, history)
+    return corpus_version, None, prompt, bool(retrieved_chunks)
+
+@dataclass
+class PreparedChatTurn:
+    """State of a chat turn once the prompt is ready (or the answer cache already answered it)."""
+    user_id: int
+    chat_session_id: Optional[int] # None until commit_chat_turn creates the session
+    collection: str
+    user_message: str
+    user_message_at: datetime
+    normalized_query: str
+    query_embedding: List[float]
+    use_answer_cache: bool
+    corpus_version: Optional[int]
+    cached_entry_id: Optional[int]
+    cached_answer: Optional[str]
+    llm_prompt: Optional[str]
+    has_context: bool
+
+async def _prepare_chat_turn(chat_request: ChatRequest, user_id: int, collection: str, db: Session) -> PreparedChatTurn:
+    """
+    Everything in a chat turn up to the LLM call. Nothing is written yet; the turn is persisted
+    in one transaction by _complete_chat_turn.
+    Gemini calls go through the pooled async client; the synchronous SQLAlchemy work is
+    offloaded to the thread pool so the event loop is never blocked.
+    """
+    user_message_at = datetime.now(timezone.utc)
+    normalized_query = normalize_text(chat_request.message)
 
-    # 2. Save user message
-    save_message(chat_session.id, "user", chat_request.message, db)
+    # 1-2. Session + history (one query) and the query embedding are independent, so run them together
+    (chat_session_id, history), query_embedding = await asyncio.gather(
+        asyncio.to_thread(load_chat_context, user_id, db, chat_request.session_id, collection, 5), # Last 5 messages
+        agenerate_embedding(normalized_query),
+    )
 
-    # 3. Normalize and embed user query
-    normalized_query = normalize_text(chat_request.message)
-    query_embedding = generate_embedding(normalized_query)
+    # 3. Answer cache (first turn of a session only, since later answers depend on the history),
+    #    otherwise vector search and prompt construction
+    use_answer_cache = ANSWER_CACHE_ENABLED and not history
+    corpus_version, cache_hit, llm_prompt, has_context = await asyncio.to_thread(
+        _build_chat_prompt, chat_request.message, query_embedding, history, collection, use_answer_cache, db
+    )
+    return PreparedChatTurn(
+        user_id=user_id,
+        chat_session_id=chat_session_id,
+        collection=collection,
+        user_message=chat_request.message,
+        user_message_at=user_message_at,
+        normalized_query=normalized_query,
+        query_embedding=query_embedding,
+        use_answer_cache=use_answer_cache,
+        corpus_version=corpus_version,
+        cached_entry_id=cache_hit[0] if cache_hit else None,
+        cached_answer=cache_hit[1] if cache_hit else None,
+        llm_prompt=llm_prompt,
+        has_context=has_context,
+    )
+
+def _finish_chat_turn(turn: PreparedChatTurn, llm_response: str, db: Session, completed: bool = True) -> int:
+    """
+    DB work after generation, in a single transaction. Returns the chat session id.
+    An answer cut off by a client disconnect (completed=False) is saved to the chat history only.
+    """
+    if turn.cached_entry_id is not None:
+        record_cache_hit(turn.cached_entry_id, db)
+    elif completed and turn.use_answer_cache and turn.has_context and is_cacheable_response(llm_response):
+        store_cached_answer(
+            turn.normalized_query, turn.query_embedding, llm_response, turn.collection, turn.corpus_version, db
+        )
+    chat_id, _ = commit_chat_turn(
+        turn.user_id, turn.chat_session_id, turn.collection, turn.user_message, llm_response, db,
+        user_message_at=turn.user_message_at,
+    )
+    return chat_id
 
-    # 4. Perform vector search for context
-    retrieved_chunks = perform_vector_search(query_embedding, db, collection="corporate")
+async def _complete_chat_turn(turn: PreparedChatTurn, llm_response: str, db: Session, completed: bool = True) -> int:
+    """Persists the user and assistant messages (and answer cache updates). Returns the chat session id."""
+    return await asyncio.to_thread(_finish_chat_turn, turn, llm_response, db, completed)
 
-    # 5. Get chat history (for context in LLM)
-    history = get_chat_history(chat_session.id, db, limit=5) # Last 5 messages
+async def run_rag_chat_turn(chat_request: ChatRequest, user_id: int, collection: str, db: Session) -> dict:
+    """Runs one RAG chat turn against a collection and returns the session id and answer."""
+    turn = await _prepare_chat_turn(chat_request, user_id, collection, db)
+    if turn.cached_answer is not None:
+        chat_session_id = await _complete_chat_turn(turn, turn.cached_answer, db)
+        return {"session_id": chat_session_id, "response": turn.cached_answer, "cached": True}
 
-    # 6. Construct LLM prompt
-    llm_prompt = construct_llm_prompt(chat_request.message, retrieved_chunks, history)
+    # 4. Get LLM response
+    llm_response = await aget_llm_response(turn.llm_prompt)
 
-    # 7. Get LLM response
-    llm_response = get_llm_response(llm_prompt)
+    # 5. Save the user message and AI response together
+    chat_session_id = await _complete_chat_turn(turn, llm_response, db)
+    return {"session_id": chat_session_id, "response": llm_response}
 
-    # 8. Save AI response
-    save_message(chat_session.id, "assistant", llm_response, db)
+def _sse_event(data: dict, event: Optional[str] = None) -> str:
+    """Formats one Server-Sent Event."""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n"
 
-    return {"session_id": chat_session.id, "response": llm_response}
+async def stream_rag_chat_turn(chat_request: ChatRequest, user_id: int, collection: str, db: Session) -> StreamingResponse:
+    """
+    Streaming variant of run_rag_chat_turn. Retrieval happens before the response starts, so
+    errors there are still regular HTTP errors; afterwards tokens are forwarded as SSE
+    'data' events and the turn is saved when the stream ends. The 'start' event's session_id
+    is null for a new session; the 'done' event always carries it.
+    """
+    turn = await _prepare_chat_turn(chat_request, user_id, collection, db)
+
+    async def event_stream():
+        yield _sse_event({"session_id": turn.chat_session_id, "cached": turn.cached_answer is not None}, event="start")
+        parts = []
+        completed = False # Only a fully streamed answer may go into the answer cache
+        chat_session_id = turn.chat_session_id
+        # The request's session is closed once the endpoint returns, so persist with a fresh one.
+        stream_db = SessionLocal()
+        try:
+            if turn.cached_answer is not None:
+                parts.append(turn.cached_answer)
+                yield _sse_event({"delta": turn.cached_answer})
+            else:
+                async for delta in astream_llm_response(turn.llm_prompt):
+                    parts.append(delta)
+                    yield _sse_event({"delta": delta})
+            completed = True
+        finally:
+            # Also runs when the client disconnects. That cancellation would hit the save too,
+            # so it is shielded: the partial answer is stored before the session is closed.
+            try:
+                if parts:
+                    with anyio.CancelScope(shield=True):
+                        chat_session_id = await _complete_chat_turn(turn, "".join(parts), stream_db, completed)
+            finally:
+                stream_db.close()
+        yield _sse_event({"session_id": chat_session_id}, event="done")
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.post("/chat")
+async def chat(
+    chat_request: ChatRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    return await run_rag_chat_turn(chat_request, current_user.id, "corporate", db)
 
 @app.post("/api/chat/meetings")
 async def chat_meetings(
@@ -1025,36 +1335,38 @@ async def chat_meetings(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
-    if not check_permission(current_user, "admin", db):
+    if not await asyncio.to_thread(check_permission, current_user, "admin", db):
         raise HTTPException(status_code=403, detail="Not authorized to use the meeting chat")
 
-    # 1. Get or create chat session (reusing existing chat session logic)
-    # The Chat model does not currently have a 'collection' field, so chat sessions are global.
-    chat_session = get_or_create_chat(current_user.id, db, session_id=chat_request.session_id, collection="meetings")
-
-    # 2. Save user message
-    save_message(chat_session.id, "user", chat_request.message, db)
+    # Chat sessions are scoped to the 'meetings' collection.
+    return await run_rag_chat_turn(chat_request, current_user.id, "meetings", db)
 
-    # 3. Normalize and embed user query
-    normalized_query = normalize_text(chat_request.message)
-    query_embedding = generate_embedding(normalized_query)
-
-    # 4. Perform vector search for context, specifically targeting the 'meetings' collection
-    retrieved_chunks = perform_vector_search(query_embedding, db, collection="meetings")
-
-    # 5. Get chat history (for context in LLM)
-    history = get_chat_history(chat_session.id, db, limit=5) # Last 5 messages
+@app.post("/chat/stream")
+async def chat_stream(
+    chat_request: ChatRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    return await stream_rag_chat_turn(chat_request, current_user.id, "corporate", db)
 
-    # 6. Construct LLM prompt
-    llm_prompt = construct_llm_prompt(chat_request.message, retrieved_chunks, history)
+@app.post("/api/chat/meetings/stream")
+async def chat_meetings_stream(
+    chat_request: ChatRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    if not await asyncio.to_thread(check_permission, current_user, "admin", db):
+        raise HTTPException(status_code=403, detail="Not authorized to use the meeting chat")
 
-    # 7. Get LLM response
-    llm_response = get_llm_response(llm_prompt)
+    return await stream_rag_chat_turn(chat_request, current_user.id, "meetings", db)
 
-    # 8. Save AI response
-    save_message(chat_session.id, "assistant", llm_response, db)
 
-    return {"session_id": chat_session.id, "response": llm_response}
+@app.get("/api/admin/cache-stats")
+def get_cache_stats(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Returns hit/miss counters for the chat caches."""
+    if not check_permission(current_user, "admin", db):
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    return {"query_embeddings": query_embedding_cache.get_stats()}
 
 
 @app.get("/api/chat/sessions", response_model=List[ChatSessionDisplay])
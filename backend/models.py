@@ -8,8 +8,12 @@ from sqlalchemy import (
     Text,
     Enum as SAEnum,
     Boolean,
+    Index,
+    DDL,
+    event,
 )
-from sqlalchemy.orm import relationship, declarative_base
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import relationship, declarative_base, deferred
 from sqlalchemy.sql import func
 from pgvector.sqlalchemy import Vector
 import enum
@@ -31,9 +35,17 @@ class Document(Base):
     filename = Column(String, nullable=False)
     upload_date = Column(DateTime(timezone=True), server_default=func.now())
     status = Column(SAEnum(DocumentStatus), nullable=False, default=DocumentStatus.PENDING)
-    collection = Column(String, nullable=False, default="corporate") # 'corporate' or 'meetings'
+    collection = Column(String, nullable=False, default="corporate", index=True) # 'corporate' or 'meetings'
     source_transcription_id = Column(Integer, ForeignKey('transcription_jobs.id', ondelete="CASCADE"), nullable=True)
     document_type = Column(String, nullable=True) # e.g., 'full_transcript', 'meeting_minutes', 'general_document'
+    content_hash = Column(String(64), nullable=True, index=True) # sha256 of the uploaded file
+    # Ingestion checkpoint: chunks are committed batch by batch together with these counters,
+    # so a failed ingestion can resume from source_path where it stopped.
+    source_path = Column(String, nullable=True) # Kept until ingestion succeeds
+    indexed_chunk_count = Column(Integer, nullable=False, default=0, server_default="0")
+    last_completed_batch = Column(Integer, nullable=False, default=0, server_default="0")
+    progress_text = Column(String, nullable=True)
+    error_message = Column(Text, nullable=True)
     chunks = relationship(
         "DocumentChunk", back_populates="document", cascade="all, delete-orphan"
     )
@@ -43,14 +55,77 @@ class DocumentChunk(Base):
     __tablename__ = "document_chunks"
     id = Column(Integer, primary_key=True)
     document_id = Column(
-        Integer, ForeignKey("documents.id", ondelete="CASCADE"), nullable=False
+        Integer, ForeignKey("documents.id", ondelete="CASCADE"), nullable=False, index=True
     )
     content = Column(Text, nullable=False)
     # Dimension for models/text-embedding-004
     embedding = Column(Vector(768))
     chunk_metadata = Column(JSON)
+    # Lexical side of hybrid retrieval. 'simple' config: no stemming, works for mixed Burmese/English text.
+    # Filled by the document_chunks_content_tsv trigger below, never by the application.
+    content_tsv = deferred(Column(TSVECTOR))
     document = relationship("Document", back_populates="chunks")
 
+    __table_args__ = (
+        # ANN index used by rag_chat.perform_vector_search (L2 distance).
+        Index(
+            "ix_document_chunks_embedding_hnsw",
+            "embedding",
+            postgresql_using="hnsw",
+            postgresql_with={"m": 16, "ef_construction": 64},
+            postgresql_ops={"embedding": "vector_l2_ops"},
+        ),
+        Index("ix_document_chunks_content_tsv", "content_tsv", postgresql_using="gin"),
+    )
+
+
+# Keeps content_tsv in sync with content (see migration 2b3cd0c9c21a).
+CONTENT_TSV_TRIGGER_DDL = [
+    DDL(
+        """
+        CREATE OR REPLACE FUNCTION document_chunks_content_tsv_update() RETURNS trigger AS $$
+        BEGIN
+            NEW.content_tsv := to_tsvector('simple'::regconfig, NEW.content);
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+        """
+    ),
+    DDL(
+        "CREATE TRIGGER document_chunks_content_tsv BEFORE INSERT OR UPDATE OF content ON document_chunks "
+        "FOR EACH ROW EXECUTE FUNCTION document_chunks_content_tsv_update()"
+    ),
+]
+for _ddl in CONTENT_TSV_TRIGGER_DDL:
+    event.listen(DocumentChunk.__table__, "after_create", _ddl.execute_if(dialect="postgresql"))
+
+
+class CorpusVersion(Base):
+    """Per-collection counter bumped whenever the collection's documents change."""
+    __tablename__ = "corpus_versions"
+    collection = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+
+class AnswerCacheEntry(Base):
+    __tablename__ = "answer_cache_entries"
+    id = Column(Integer, primary_key=True)
+    collection = Column(String, nullable=False, index=True)
+    corpus_version = Column(Integer, nullable=False)
+    query_text = Column(Text, nullable=False)
+    query_embedding = Column(Vector(768), nullable=False)
+    answer = Column(Text, nullable=False)
+    hit_count = Column(Integer, nullable=False, default=0, server_default="0")
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class ChunkEmbeddingCacheEntry(Base):
+    """Document-chunk embeddings keyed by a hash of (normalized text, model, task type, dimension)."""
+    __tablename__ = "chunk_embedding_cache"
+    content_hash = Column(String(64), primary_key=True)
+    embedding = Column(Vector(768), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
 
 class TranscriptionJobStatus(enum.Enum):
     PENDING = "PENDING"
@@ -74,6 +149,9 @@ class TranscriptionJob(Base):
     meeting_name = Column(String, nullable=False) # New field to store the meeting name
     error_message = Column(Text)
     celery_task_id = Column(String, nullable=True) # New field to store Celery task ID
+    started_at = Column(DateTime(timezone=True), nullable=True) # Dispatched by the scheduler
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+    segment_offsets = Column(JSON, nullable=True) # [{"index", "start", "end"}] seconds into the recording per transcribed segment
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now(), server_default=func.now())
 
@@ -1,10 +1,101 @@
+import asyncio
 import os
 import unicodedata
+import httpx
+import numpy as np
 import requests
-from typing import List, Optional
+import json
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import AsyncIterator, List, Optional, Tuple
 
+from sqlalchemy import Text, cast, func, insert, literal_column, select, true, union_all
+from sqlalchemy.dialects.postgresql import TSQUERY
 from sqlalchemy.orm import Session
 from models import Chat, ChatMessage, DocumentChunk, Document # Import Document
+from embedding_cache import EMBEDDING_CACHE_ENABLED, query_embedding_cache
+from rag_pipeline import estimate_tokens
+from chunking import CHUNK_OVERLAP
+
+# --- Vector search settings ---
+# 'ann' uses the HNSW index on document_chunks.embedding, 'exact' forces a sequential scan.
+VECTOR_SEARCH_MODE = os.getenv("VECTOR_SEARCH_MODE", "ann")
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", 40))
+IVFFLAT_PROBES = int(os.getenv("IVFFLAT_PROBES", 10))
+# Keeps scanning the index until enough rows pass the collection filter (pgvector >= 0.8.0).
+# Set to 'off' on older pgvector versions.
+VECTOR_ITERATIVE_SCAN = os.getenv("VECTOR_ITERATIVE_SCAN", "strict_order")
+
+# --- Retrieval settings ---
+# 'vector' (L2 search only), 'keyword' (full-text only) or 'hybrid' (both, fused with reciprocal-rank fusion).
+RETRIEVAL_MODES = ("vector", "keyword", "hybrid")
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "vector")
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", 40))
+HYBRID_RRF_K = int(os.getenv("HYBRID_RRF_K", 60))
+
+# Optional second stage: over-fetch MMR_CANDIDATES chunks and pick top_k of them with
+# maximal marginal relevance, so near-duplicate chunks don't crowd out the prompt.
+RERANK_MODE = os.getenv("RERANK_MODE", "none") # 'none' or 'mmr'
+MMR_CANDIDATES = int(os.getenv("MMR_CANDIDATES", 20))
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", 0.7)) # 1.0 = pure relevance, 0.0 = pure diversity
+
+# --- Prompt context settings ---
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 2000))
+# Joins adjacent chunks that don't overlap (e.g. speaker turns) in a context block.
+CHUNK_SEPARATOR = "\n"
+
+GEMINI_API_BASE = "https://generativelanguage.googleapis.com/v1beta/models"
+# Connection pool for the async chat path; connections to Gemini are kept alive between turns.
+GEMINI_HTTP_MAX_CONNECTIONS = int(os.getenv("GEMINI_HTTP_MAX_CONNECTIONS", 100))
+GEMINI_HTTP_MAX_KEEPALIVE = int(os.getenv("GEMINI_HTTP_MAX_KEEPALIVE", 20))
+
+_http_client: Optional[httpx.AsyncClient] = None
+
+LLM_BLOCKED_RESPONSE = "Response was blocked due to safety settings or other reasons."
+LLM_ERROR_PREFIX = "Error: Could not get a response from the AI model."
+
+@dataclass
+class RetrievedChunk:
+    """Projection of a retrieved chunk: just what prompt construction needs, no embedding."""
+    document_id: int
+    content: str
+    filename: str
+    chunk_number: Optional[int]
+    token_count: Optional[int]
+    distance: Optional[float]
+    embedding: Optional[List[float]] = None # Only selected for re-ranking
+    overlap_chars: Optional[int] = None # Leading characters repeated from the previous chunk, recorded by the chunker; None for older chunks
+
+@dataclass
+class ContextBlock:
+    """One or more adjacent chunks of the same document, merged for the prompt."""
+    document_id: int
+    filename: str
+    first_chunk: Optional[int]
+    last_chunk: Optional[int]
+    content: str
+    token_count: int
+
+def get_http_client() -> httpx.AsyncClient:
+    """Returns the shared async HTTP client, creating it on first use."""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            headers={'Content-Type': 'application/json'},
+            limits=httpx.Limits(
+                max_connections=GEMINI_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=GEMINI_HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=60,
+            ),
+            timeout=httpx.Timeout(60, connect=10),
+        )
+    return _http_client
+
+async def close_http_client() -> None:
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
 
 def get_or_create_chat(
     user_id: int, db: Session, session_id: Optional[int] = None, collection: str = "corporate"
@@ -42,28 +133,80 @@ def get_chat_history(chat_id: int, db: Session, limit: int = 10) -> List[ChatMes
     return (
         db.query(ChatMessage)
         .filter(ChatMessage.chat_id == chat_id)
-        .order_by(ChatMessage.created_at.desc())
+        .order_by(ChatMessage.created_at.desc(), ChatMessage.id.desc())
         .limit(limit)
         .all()
     )
 
+def load_chat_context(
+    user_id: int, db: Session, session_id: Optional[int] = None, collection: str = "corporate", limit: int = 10
+) -> Tuple[Optional[int], list]:
+    """
+    Loads a user's chat session and its most recent messages (newest first) in one query.
+    The messages are rows with .role and .content. Returns (None, []) when there is no
+    matching session; commit_chat_turn creates it together with the first messages.
+    """
+    if not session_id:
+        return None, []
+
+    recent = (
+        select(ChatMessage.id, ChatMessage.role, ChatMessage.content, ChatMessage.created_at)
+        .where(ChatMessage.chat_id == Chat.id)
+        .order_by(ChatMessage.created_at.desc(), ChatMessage.id.desc())
+        .limit(limit)
+        .lateral("recent")
+    )
+    rows = db.execute(
+        select(Chat.id.label("chat_id"), recent.c.role, recent.c.content)
+        .outerjoin(recent, true())
+        .where(Chat.id == session_id, Chat.user_id == user_id, Chat.collection == collection)
+        .order_by(recent.c.created_at.desc(), recent.c.id.desc())
+    ).all()
+    if not rows:
+        return None, []
+    return rows[0].chat_id, [row for row in rows if row.role is not None]
+
+def commit_chat_turn(
+    user_id: int, chat_id: Optional[int], collection: str, user_message: str, assistant_message: str,
+    db: Session, user_message_at: Optional[datetime] = None,
+) -> Tuple[int, int]:
+    """
+    Writes a whole chat turn in one transaction: creates the chat if needed and inserts both
+    messages with a single INSERT ... RETURNING, then commits once (together with anything
+    else pending on the session). Returns (chat_id, assistant_message_id).
+    """
+    if chat_id is None:
+        chat_id = db.execute(
+            insert(Chat).values(user_id=user_id, collection=collection).returning(Chat.id)
+        ).scalar_one()
+
+    # Explicit timestamps: server-side now() would give both messages the same created_at.
+    now = datetime.now(timezone.utc)
+    message_ids = db.execute(
+        insert(ChatMessage).returning(ChatMessage.id),
+        [
+            {"chat_id": chat_id, "role": "user", "content": user_message, "created_at": user_message_at or now},
+            {"chat_id": chat_id, "role": "assistant", "content": assistant_message, "created_at": now},
+        ],
+    ).scalars().all()
+    db.commit()
+    return chat_id, max(message_ids)
+
 def normalize_text(text: str) -> str:
     """Converts text to Unicode Normalization Form C (NFC)."""
     if not isinstance(text, str):
         return ""
     return unicodedata.normalize("NFC", text)
 
-def generate_embedding(text: str) -> List[float]:
-    """Generates an embedding for a single user query using Google's REST API."""
-    if not text.strip():
-        return []
-
+def _get_api_key() -> str:
     api_key = os.getenv("GEMINI_API_KEY")
     if not api_key:
         raise RuntimeError("GEMINI_API_KEY not found in environment variables.")
+    return api_key
 
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-embedding-001:embedContent?key={api_key}"
-    headers = {'Content-Type': 'application/json'}
+def _embedding_request(text: str) -> Tuple[str, dict]:
+    """Builds the URL and body for an embedContent (RETRIEVAL_QUERY) call."""
+    url = f"{GEMINI_API_BASE}/gemini-embedding-001:embedContent?key={_get_api_key()}"
     body = {
         "model": "models/gemini-embedding-001",
         "taskType": "RETRIEVAL_QUERY",
@@ -72,23 +215,88 @@ def generate_embedding(text: str) -> List[float]:
         },
         "output_dimensionality": 768
     }
+    return url, body
+
+def generate_embedding(text: str) -> List[float]:
+    """Generates an embedding for a single user query using Google's REST API."""
+    if not text.strip():
+        return []
+
+    # Repeated questions are served from the query embedding cache (in-process LRU + Redis).
+    cache_key_text = normalize_text(text).strip()
+    if EMBEDDING_CACHE_ENABLED:
+        cached = query_embedding_cache.get(cache_key_text)
+        if cached is not None:
+            return cached
+
+    url, body = _embedding_request(text)
+    headers = {'Content-Type': 'application/json'}
 
     try:
         response = requests.post(url, headers=headers, json=body, timeout=30)
         response.raise_for_status()
         data = response.json()
-        return data.get('embedding', {}).get('values', [])
+        embedding = data.get('embedding', {}).get('values', [])
+        if EMBEDDING_CACHE_ENABLED:
+            query_embedding_cache.set(cache_key_text, embedding)
+        return embedding
     except requests.exceptions.RequestException as e:
         print(f"Error calling Gemini embedding API: {e}")
         raise
 
+async def agenerate_embedding(text: str) -> List[float]:
+    """Async variant of generate_embedding using the pooled HTTP client."""
+    if not text.strip():
+        return []
+
+    cache_key_text = normalize_text(text).strip()
+    if EMBEDDING_CACHE_ENABLED:
+        # The Redis tier does blocking I/O, so keep it off the event loop.
+        cached = await asyncio.to_thread(query_embedding_cache.get, cache_key_text)
+        if cached is not None:
+            return cached
+
+    url, body = _embedding_request(text)
+
+    try:
+        response = await get_http_client().post(url, json=body, timeout=30)
+        response.raise_for_status()
+        data = response.json()
+        embedding = data.get('embedding', {}).get('values', [])
+        if EMBEDDING_CACHE_ENABLED:
+            await asyncio.to_thread(query_embedding_cache.set, cache_key_text, embedding)
+        return embedding
+    except httpx.HTTPError as e:
+        print(f"Error calling Gemini embedding API: {e}")
+        raise
+
+def configure_vector_search(db: Session, top_k: int = 5, mode: Optional[str] = None) -> None:
+    """Applies the ANN search settings for the current transaction (SET LOCAL semantics)."""
+    mode = mode or VECTOR_SEARCH_MODE
+    settings = {}
+    if mode == "exact":
+        settings["enable_indexscan"] = "off"
+    else:
+        # ef_search smaller than LIMIT would silently truncate the result set.
+        settings["hnsw.ef_search"] = str(max(HNSW_EF_SEARCH, top_k))
+        settings["ivfflat.probes"] = str(IVFFLAT_PROBES)
+        if VECTOR_ITERATIVE_SCAN != "off":
+            settings["hnsw.iterative_scan"] = VECTOR_ITERATIVE_SCAN
+            settings["ivfflat.iterative_scan"] = "relaxed_order"
+
+    # One round trip; set_config(..., true) only lasts until the end of the transaction.
+    db.execute(select(*[func.set_config(name, value, True) for name, value in settings.items()]))
+
 def perform_vector_search(
-    query_embedding: List[float], db: Session, top_k: int = 5, collection: Optional[str] = None
+    query_embedding: List[float], db: Session, top_k: int = 5, collection: Optional[str] = None,
+    mode: Optional[str] = None,
 ) -> List[DocumentChunk]:
     """Performs a vector similarity search using L2 distance, optionally filtering by collection."""
     if not query_embedding:
         return []
     
+    configure_vector_search(db, top_k=top_k, mode=mode)
+
     query = db.query(DocumentChunk)
     
     if collection:
@@ -101,12 +309,259 @@ def perform_vector_search(
     )
     return results
 
+def _chunk_projection(query_embedding: List[float], include_embedding: bool = False):
+    """Columns selected for RetrievedChunk rows; the embedding only when a re-ranker needs it."""
+    columns = (
+        DocumentChunk.document_id,
+        DocumentChunk.content,
+        Document.filename,
+        DocumentChunk.chunk_metadata["chunk_number"].as_integer().label("chunk_number"),
+        DocumentChunk.chunk_metadata["token_count"].as_integer().label("token_count"),
+        DocumentChunk.embedding.l2_distance(query_embedding).label("distance"),
+        DocumentChunk.chunk_metadata["overlap_chars"].as_integer().label("overlap_chars"),
+    )
+    if include_embedding:
+        columns += (DocumentChunk.embedding,)
+    return columns
+
+def search_chunks(
+    query_embedding: List[float], db: Session, top_k: int = 5, collection: Optional[str] = None,
+    mode: Optional[str] = None, include_embedding: bool = False,
+) -> List[RetrievedChunk]:
+    """
+    Same search as perform_vector_search, but as a single joined query returning
+    RetrievedChunk rows instead of ORM objects, so filenames need no lazy loads and
+    embeddings are never sent back to the client.
+    """
+    if not query_embedding:
+        return []
+
+    configure_vector_search(db, top_k=top_k, mode=mode)
+
+    query = db.query(*_chunk_projection(query_embedding, include_embedding)).join(Document, Document.id == DocumentChunk.document_id)
+    if collection:
+        query = query.filter(Document.collection == collection)
+
+    rows = query.order_by(DocumentChunk.embedding.l2_distance(query_embedding)).limit(top_k).all()
+    return [RetrievedChunk(**row._mapping) for row in rows]
+
+def perform_hybrid_search(
+    query_text: str, query_embedding: List[float], db: Session, top_k: int = 5,
+    collection: Optional[str] = None, candidates: int = HYBRID_CANDIDATES, rrf_k: int = HYBRID_RRF_K,
+    include_embedding: bool = False, mode: str = "hybrid",
+) -> List[RetrievedChunk]:
+    """
+    Hybrid retrieval in a single statement: the top `candidates` chunks by L2 distance and by
+    full-text rank are fused with reciprocal-rank fusion (sum of 1 / (rrf_k + rank)).
+    mode 'vector' or 'keyword' uses only that one ranking.
+    """
+    if mode not in RETRIEVAL_MODES:
+        raise ValueError(f"Unknown retrieval mode '{mode}'")
+    if not query_embedding:
+        return []
+
+    rankings = []
+    if mode != "keyword":
+        configure_vector_search(db, top_k=candidates)
+        distance = DocumentChunk.embedding.l2_distance(query_embedding)
+        vector_query = select(DocumentChunk.id.label("id"), distance.label("distance"))
+        if collection:
+            vector_query = vector_query.join(Document, Document.id == DocumentChunk.document_id).where(Document.collection == collection)
+        vector_top = vector_query.order_by(distance).limit(candidates).subquery("vector_top")
+        vector_hits = select(
+            vector_top.c.id, func.row_number().over(order_by=vector_top.c.distance).label("rank")
+        ).cte("vector_hits")
+        rankings.append(select(vector_hits.c.id, vector_hits.c.rank))
+
+    if mode != "vector":
+        rankings.append(_text_ranking(query_text, collection, candidates))
+
+    all_hits = (union_all(*rankings) if len(rankings) > 1 else rankings[0]).subquery("all_hits")
+    fused = (
+        select(all_hits.c.id, func.sum(1.0 / (rrf_k + all_hits.c.rank)).label("score"))
+        .group_by(all_hits.c.id)
+        .cte("fused")
+    )
+
+    rows = (
+        db.query(*_chunk_projection(query_embedding, include_embedding))
+        .select_from(DocumentChunk)
+        .join(fused, fused.c.id == DocumentChunk.id)
+        .join(Document, Document.id == DocumentChunk.document_id)
+        .order_by(fused.c.score.desc())
+        .limit(top_k)
+        .all()
+    )
+    return [RetrievedChunk(**row._mapping) for row in rows]
+
+def _text_ranking(query_text: str, collection: Optional[str], candidates: int):
+    """(id, rank) of the top `candidates` chunks by full-text rank."""
+    # plainto_tsquery ANDs every term; OR them instead so partial matches still rank.
+    ts_query = cast(
+        func.replace(
+            cast(func.plainto_tsquery(literal_column("'simple'::regconfig"), query_text), Text), " & ", " | "
+        ),
+        TSQUERY,
+    )
+
+    text_rank = func.ts_rank_cd(DocumentChunk.content_tsv, ts_query)
+    text_query = select(DocumentChunk.id.label("id"), text_rank.label("text_rank")).where(
+        DocumentChunk.content_tsv.op("@@")(ts_query)
+    )
+    if collection:
+        text_query = text_query.join(Document, Document.id == DocumentChunk.document_id).where(Document.collection == collection)
+    text_top = text_query.order_by(text_rank.desc()).limit(candidates).subquery("text_top")
+    text_hits = select(
+        text_top.c.id, func.row_number().over(order_by=text_top.c.text_rank.desc()).label("rank")
+    ).cte("text_hits")
+    return select(text_hits.c.id, text_hits.c.rank)
+
+def mmr_select(
+    query_embedding: List[float], candidates: List[RetrievedChunk], k: int, lambda_mult: float = MMR_LAMBDA
+) -> List[RetrievedChunk]:
+    """
+    Maximal marginal relevance over candidates that carry embeddings: repeatedly picks the
+    candidate maximising lambda * sim(query) - (1 - lambda) * max sim(already selected),
+    using cosine similarity. Vectorised with NumPy; O(k * n) after one n x n similarity matrix.
+    """
+    if len(candidates) <= k:
+        return list(candidates)
+
+    vectors = np.asarray([chunk.embedding for chunk in candidates], dtype=np.float32)
+    vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    query = np.asarray(query_embedding, dtype=np.float32)
+    query /= max(float(np.linalg.norm(query)), 1e-12)
+
+    relevance = vectors @ query
+    similarity = vectors @ vectors.T
+
+    selected = [int(np.argmax(relevance))]
+    max_similarity = similarity[:, selected[0]].copy()
+    available = np.ones(len(candidates), dtype=bool)
+    available[selected[0]] = False
+    while len(selected) < k:
+        scores = lambda_mult * relevance - (1 - lambda_mult) * max_similarity
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        np.maximum(max_similarity, similarity[:, best], out=max_similarity)
+
+    return [candidates[i] for i in selected]
+
+def retrieve_chunks(
+    query_text: str, query_embedding: List[float], db: Session, top_k: int = 5,
+    collection: Optional[str] = None, mode: Optional[str] = None, rerank: Optional[str] = None,
+) -> List[RetrievedChunk]:
+    """
+    Retrieves context chunks using the configured RETRIEVAL_MODE ('vector', 'keyword' or 'hybrid'),
+    optionally diversified with MMR over MMR_CANDIDATES over-fetched chunks (RERANK_MODE).
+    """
+    mode = mode or RETRIEVAL_MODE
+    rerank = rerank or RERANK_MODE
+    use_mmr = rerank == "mmr"
+    fetch_k = max(MMR_CANDIDATES, top_k) if use_mmr else top_k
+
+    if mode in ("hybrid", "keyword"):
+        chunks = perform_hybrid_search(
+            query_text, query_embedding, db, top_k=fetch_k, collection=collection,
+            candidates=max(HYBRID_CANDIDATES, fetch_k), include_embedding=use_mmr, mode=mode,
+        )
+    else:
+        chunks = search_chunks(query_embedding, db, top_k=fetch_k, collection=collection, include_embedding=use_mmr)
+
+    if use_mmr:
+        chunks = mmr_select(query_embedding, chunks, top_k)
+        for chunk in chunks:
+            chunk.embedding = None # Not needed past this point
+    return chunks
+
+def pack_context(retrieved_chunks: List[RetrievedChunk], token_budget: int = CONTEXT_TOKEN_BUDGET) -> List[ContextBlock]:
+    """
+    Turns retrieved chunks into prompt context blocks:
+    adjacent chunks of the same document are merged with the overlap their chunker recorded
+    (overlap_chars; CHUNK_OVERLAP for chunks indexed before it was recorded, which all come
+    from fixed windows) removed, or joined with a line break if they don't overlap, then
+    blocks are added in retrieval order while they fit in the token budget. If even the best
+    block is over budget, a prefix of it is used.
+    """
+    # Group by document, keeping the rank of each document's best chunk.
+    by_document = {}
+    for rank, chunk in enumerate(retrieved_chunks):
+        by_document.setdefault(chunk.document_id, []).append((rank, chunk))
+
+    blocks = []  # (best rank, ContextBlock)
+    for entries in by_document.values():
+        entries.sort(key=lambda entry: (entry[1].chunk_number is None, entry[1].chunk_number))
+        current = None
+        current_rank = None
+        for rank, chunk in entries:
+            tokens = chunk.token_count if chunk.token_count is not None else estimate_tokens(chunk.content)
+            is_adjacent = (
+                current is not None
+                and chunk.chunk_number is not None
+                and current.last_chunk is not None
+                and chunk.chunk_number == current.last_chunk + 1
+            )
+            if is_adjacent:
+                overlap = CHUNK_OVERLAP if chunk.overlap_chars is None else chunk.overlap_chars
+                if overlap and not current.content.endswith(chunk.content[:overlap]):
+                    overlap = 0 # Stale metadata; keep the text rather than cut it
+                if overlap:
+                    current.content += chunk.content[overlap:]
+                    current.token_count += tokens - estimate_tokens(chunk.content[:overlap])
+                else:
+                    # Separate chunks that don't share text, so words at the boundary aren't glued together.
+                    current.content += CHUNK_SEPARATOR + chunk.content
+                    current.token_count += tokens + estimate_tokens(CHUNK_SEPARATOR)
+                current.last_chunk = chunk.chunk_number
+                current_rank = min(current_rank, rank)
+                continue
+            if current is not None:
+                blocks.append((current_rank, current))
+            current = ContextBlock(
+                document_id=chunk.document_id,
+                filename=chunk.filename,
+                first_chunk=chunk.chunk_number,
+                last_chunk=chunk.chunk_number,
+                content=chunk.content,
+                token_count=tokens,
+            )
+            current_rank = rank
+        if current is not None:
+            blocks.append((current_rank, current))
+
+    blocks.sort(key=lambda entry: entry[0])
+
+    packed = []
+    used = 0
+    for _, block in blocks:
+        if used + block.token_count <= token_budget:
+            packed.append(block)
+            used += block.token_count
+        elif not packed:
+            # Even the best block alone is over budget: keep a proportional prefix of it.
+            keep_chars = max(1, int(len(block.content) * token_budget / block.token_count))
+            block.content = block.content[:keep_chars]
+            block.token_count = estimate_tokens(block.content)
+            packed.append(block)
+            break
+    return packed
+
+def _format_chunk_range(block: ContextBlock) -> str:
+    if block.first_chunk is None:
+        return "Chunk N/A"
+    if block.first_chunk == block.last_chunk:
+        return f"Chunk {block.first_chunk}"
+    return f"Chunks {block.first_chunk}-{block.last_chunk}"
+
 def construct_llm_prompt(
-    user_query: str, retrieved_chunks: List[DocumentChunk], chat_history: List[ChatMessage]
+    user_query: str, retrieved_chunks: List[RetrievedChunk], chat_history: List[ChatMessage],
+    token_budget: int = CONTEXT_TOKEN_BUDGET,
 ) -> str:
-    """Assembles a structured prompt for the Gemini LLM."""
+    """Assembles a structured prompt for the Gemini LLM, packing the context to `token_budget` tokens."""
     context_str = "\n---\n".join(
-        [f"Source: {chunk.document.filename}, Chunk {chunk.chunk_metadata.get('chunk_number', 'N/A')}\n{chunk.content}" for chunk in retrieved_chunks]
+        [f"Source: {block.filename}, {_format_chunk_range(block)}\n{block.content}" for block in pack_context(retrieved_chunks, token_budget)]
     )
     history_str = "\n".join(
         [f"{msg.role}: {msg.content}" for msg in reversed(chat_history)]
@@ -127,14 +582,12 @@ System Preamble: You are a helpful and precise HR assistant for an internal comp
 """
     return prompt
 
-def get_llm_response(prompt: str) -> str:
-    """Generates a response from the Gemini 1.5 Flash model using the REST API."""
-    api_key = os.getenv("GEMINI_API_KEY")
-    if not api_key:
-        raise RuntimeError("GEMINI_API_KEY not found in environment variables.")
-
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash:generateContent?key={api_key}"
-    headers = {'Content-Type': 'application/json'}
+def _llm_request(prompt: str, stream: bool = False) -> Tuple[str, dict]:
+    """Builds the URL and body for a generateContent (or streamGenerateContent) call."""
+    if stream:
+        url = f"{GEMINI_API_BASE}/gemini-2.5-flash:streamGenerateContent?alt=sse&key={_get_api_key()}"
+    else:
+        url = f"{GEMINI_API_BASE}/gemini-2.5-flash:generateContent?key={_get_api_key()}"
     body = {
         "contents": [{
             "parts": [{"text": prompt}]
@@ -144,17 +597,67 @@ def get_llm_response(prompt: str) -> str:
             {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
         ]
     }
+    return url, body
+
+def _parse_llm_response(data: dict) -> str:
+    if not data.get('candidates'):
+        return LLM_BLOCKED_RESPONSE
+    return data['candidates'][0]['content']['parts'][0]['text']
+
+def get_llm_response(prompt: str) -> str:
+    """Generates a response from the Gemini 2.5 Flash model using the REST API."""
+    url, body = _llm_request(prompt)
+    headers = {'Content-Type': 'application/json'}
 
     try:
         response = requests.post(url, headers=headers, json=body, timeout=60)
         response.raise_for_status()
-        data = response.json()
-        
-        if not data.get('candidates'):
-            return "Response was blocked due to safety settings or other reasons."
-            
-        return data['candidates'][0]['content']['parts'][0]['text']
+        return _parse_llm_response(response.json())
     except requests.exceptions.RequestException as e:
         print(f"Error during Gemini API call: {e}")
-        return f"Error: Could not get a response from the AI model. Details: {str(e)}"
+        return f"{LLM_ERROR_PREFIX} Details: {str(e)}"
+
+async def aget_llm_response(prompt: str) -> str:
+    """Async variant of get_llm_response using the pooled HTTP client."""
+    url, body = _llm_request(prompt)
+
+    try:
+        response = await get_http_client().post(url, json=body, timeout=60)
+        response.raise_for_status()
+        return _parse_llm_response(response.json())
+    except httpx.HTTPError as e:
+        print(f"Error during Gemini API call: {e}")
+        return f"{LLM_ERROR_PREFIX} Details: {str(e)}"
+
+async def astream_llm_response(prompt: str) -> AsyncIterator[str]:
+    """
+    Streams the Gemini response as text deltas via streamGenerateContent (SSE).
+    Like get_llm_response, failures are reported as text rather than raised.
+    """
+    url, body = _llm_request(prompt, stream=True)
+    produced_text = False
+
+    try:
+        async with get_http_client().stream("POST", url, json=body, timeout=60) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = json.loads(line[len("data:"):].strip())
+                for candidate in data.get('candidates', []):
+                    for part in candidate.get('content', {}).get('parts', []):
+                        if part.get('text'):
+                            produced_text = True
+                            yield part['text']
+    except httpx.HTTPError as e:
+        print(f"Error during Gemini streaming API call: {e}")
+        yield f"{LLM_ERROR_PREFIX} Details: {str(e)}"
+        return
+
+    if not produced_text:
+        yield LLM_BLOCKED_RESPONSE
 
+def is_cacheable_response(response: str) -> bool:
+    """True for real model answers, False for the blocked/error fallbacks above."""
+    # A stream can fail part-way through, so look for the error marker anywhere in the text.
+    return bool(response) and response != LLM_BLOCKED_RESPONSE and LLM_ERROR_PREFIX not in response
@@ -1,46 +1,57 @@
+import logging
+import multiprocessing
 import os
-import re
-import requests
-import unicodedata
-from typing import List, Optional # Added Optional
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Iterable, Iterator, List, Optional, Tuple # Added Optional
 
 from pypdf import PdfReader
 from sqlalchemy.orm import Session
 
 from models import Document, DocumentChunk, DocumentStatus
+from answer_cache import bump_corpus_version
+from embedding_engine import EMBED_MAX_BATCH_SIZE, document_embedder
+from chunk_loader import write_document_chunks
+from chunk_embedding_cache import (
+    CHUNK_EMBEDDING_CACHE_ENABLED,
+    chunk_content_hash,
+    lookup_cached_embeddings,
+    store_cached_embeddings,
+)
+# Text helpers live in chunking; re-exported here for existing importers.
+from chunking import (
+    chunk_document_with_overlap,
+    clean_text,
+    estimate_tokens,
+    iter_chunks,
+    iter_clean_text,
+    split_text,
+)
 from dotenv import load_dotenv
 
 load_dotenv()
 
-# 1. CLEANING FUNCTION
-def clean_text(text):
-    if not text:
-        return ""
-    # Remove null bytes or non-printable characters
-    text = text.replace('\x00', '')
-    # Replace multiple spaces/newlines with a single space
-    text = re.sub(r'\s+', ' ', text)
-    # Strip leading/trailing whitespace
-    return text.strip()
-
-# 2. SPLIT FUNCTION
-def split_text(text, chunk_size=1000, overlap=100):
-    chunks = []
-    start = 0
-    text_len = len(text)
-    while start < text_len:
-        end = min(start + chunk_size, text_len)
-        chunks.append(text[start:end])
-        if end == text_len: break
-        start += (chunk_size - overlap)
-    return chunks
+logger = logging.getLogger(__name__)
+
+def iter_batches(items: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(items)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
 
 # 3. EMBEDDING GENERATOR
-def generate_embeddings(chunks):
-    api_key = os.getenv("GEMINI_API_KEY")
-    if not api_key:
-        raise RuntimeError("GEMINI_API_KEY not found")
+EMBED_BATCH_SIZE = EMBED_MAX_BATCH_SIZE
+# Chunks per DB write; the embedding engine splits these into API-sized requests itself.
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", EMBED_BATCH_SIZE))
 
+def embed_batch(batch: List[str]) -> List[List[float]]:
+    """Embeds one batch of chunks (retried and split as needed by the embedding engine)."""
+    return document_embedder.embed(batch)
+
+def generate_embeddings(chunks):
     # Filter garbage
     valid_chunks = [c for c in chunks if c and c.strip()]
     
@@ -48,119 +59,341 @@ def generate_embeddings(chunks):
         print("DEBUG: No valid chunks to embed.")
         return [], []
 
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-embedding-001:batchEmbedContents?key={api_key}"
     all_embeddings = []
     
-    # Process in batches of 100
-    BATCH_SIZE = 100
-    
-    for i in range(0, len(valid_chunks), BATCH_SIZE):
-        batch = valid_chunks[i : i + BATCH_SIZE]
-        payload = {
-            "requests": [
-                {
-                    "model": "models/gemini-embedding-001",
-                    "taskType": "RETRIEVAL_DOCUMENT",
-                    "title": "Handbook Chunk",
-                    "content": {"parts": [{"text": chunk}]},
-                    "output_dimensionality": 768
-                } for chunk in batch
-            ]
-        }
-
-        try:
-            print(f"DEBUG: Sending clean batch {i} to {i + len(batch)}...")
-            response = requests.post(url, json=payload, headers={"Content-Type": "application/json"})
-            
-            if response.status_code != 200:
-                print(f"CRITICAL ERROR: {response.text}")
-                response.raise_for_status()
-            
-            batch_embeddings = [item['values'] for item in response.json()['embeddings']]
-            all_embeddings.extend(batch_embeddings)
-            
-        except Exception as e:
-            print(f"Error in batch {i}: {e}")
-            raise e
+    # Batches of 100, several in flight at once
+    batches = iter_batches(valid_chunks, EMBED_BATCH_SIZE)
+    for i, (batch, embeddings) in enumerate(document_embedder.embed_batches(batches)):
+        logger.debug("Embedded batch %d to %d", i * EMBED_BATCH_SIZE, i * EMBED_BATCH_SIZE + len(batch))
+        all_embeddings.extend(embeddings)
 
     return all_embeddings, valid_chunks
 
-def extract_text_from_pdf(file_path: str) -> str:
-    """Extracts text from a PDF file."""
+def embed_batches_cached(batches: Iterable[List[str]], db: Session) -> Iterator[Tuple[List[str], list]]:
+    """
+    Like document_embedder.embed_batches, but chunks whose content hash is in the chunk
+    embedding cache are not sent to the API. Each batch costs one cache lookup query; the
+    new vectors are added to the session (and committed with the batch's chunks).
+    """
+    if not CHUNK_EMBEDDING_CACHE_ENABLED:
+        yield from document_embedder.embed_batches(batches)
+        return
+
+    task_type = document_embedder.task_type
+    pending = deque()
+
+    def misses() -> Iterator[List[str]]:
+        # Runs on the caller's thread as the engine pulls batches, so `db` stays single-threaded.
+        for batch in batches:
+            hashes = [chunk_content_hash(chunk, task_type) for chunk in batch]
+            cached = lookup_cached_embeddings(hashes, db)
+            missing = {}
+            for chunk, content_hash in zip(batch, hashes):
+                if content_hash not in cached:
+                    missing.setdefault(content_hash, chunk) # repeated boilerplate is embedded once
+            pending.append((batch, hashes, cached, list(missing)))
+            yield list(missing.values())
+
+    for _, embeddings in document_embedder.embed_batches(misses()):
+        batch, hashes, cached, missing_hashes = pending.popleft()
+        new_embeddings = dict(zip(missing_hashes, embeddings))
+        store_cached_embeddings(new_embeddings, db)
+        cached.update(new_embeddings)
+        if len(missing_hashes) < len(batch):
+            logger.debug("%d of %d chunks reused a cached or duplicate embedding", len(batch) - len(missing_hashes), len(batch))
+        yield batch, [cached[content_hash] for content_hash in hashes]
+
+# Parallel PDF extraction: pypdf is pure Python, so page ranges are parsed in worker processes.
+# 1 keeps extraction in the calling process.
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", 1))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", 20))
+
+_pdf_pool = None
+
+def _get_pdf_pool() -> ProcessPoolExecutor:
+    global _pdf_pool
+    if _pdf_pool is None:
+        # spawn, not fork: ingestion runs in threads of a process that also holds DB connections
+        _pdf_pool = ProcessPoolExecutor(
+            max_workers=PDF_EXTRACT_WORKERS, mp_context=multiprocessing.get_context("spawn")
+        )
+    return _pdf_pool
+
+def _extract_pdf_page_range(file_path: str, start: int, end: int) -> List[str]:
+    """Worker: extracts pages [start, end) of a PDF."""
+    reader = PdfReader(file_path)
+    texts = []
+    for page in reader.pages[start:end]:
+        page_text = page.extract_text()
+        if page_text:
+            texts.append(page_text + "\n")
+    return texts
+
+def iter_pdf_pages_parallel(file_path: str, page_count: int, workers: int = PDF_EXTRACT_WORKERS) -> Iterator[str]:
+    """
+    Extracts page ranges of PDF_PAGES_PER_TASK pages in a process pool and yields page texts
+    in page order. Only a few ranges per worker are in flight, so a slow consumer (embedding)
+    doesn't make finished pages pile up in memory.
+    """
+    pool = _get_pdf_pool()
+    ranges = iter(range(0, page_count, PDF_PAGES_PER_TASK))
+    in_flight = deque()
+
+    def submit_next() -> bool:
+        start = next(ranges, None)
+        if start is None:
+            return False
+        end = min(start + PDF_PAGES_PER_TASK, page_count)
+        in_flight.append(pool.submit(_extract_pdf_page_range, file_path, start, end))
+        return True
+
+    for _ in range(workers * 2):
+        if not submit_next():
+            break
+    try:
+        while in_flight:
+            texts = in_flight.popleft().result()
+            submit_next()
+            yield from texts
+    finally:
+        for future in in_flight:
+            future.cancel()
+
+def iter_pdf_pages(file_path: str) -> Iterator[str]:
+    """Yields the text of a PDF one page at a time (pypdf parses pages lazily)."""
     reader = PdfReader(file_path)
-    text = ""
+    page_count = len(reader.pages)
+    if PDF_EXTRACT_WORKERS > 1 and page_count > PDF_PAGES_PER_TASK:
+        yield from iter_pdf_pages_parallel(file_path, page_count)
+        return
     for page in reader.pages:
         page_text = page.extract_text()
         if page_text:
-            text += page_text + "\n"
-    return text
+            yield page_text + "\n"
+
+def extract_text_from_pdf(file_path: str) -> str:
+    """Extracts text from a PDF file."""
+    return "".join(iter_pdf_pages(file_path))
+
+def iter_text_lines(file_path: str) -> Iterator[str]:
+    with open(file_path, "r", encoding="utf-8") as f:
+        yield from f
+
+TEXT_DOCUMENT_TYPES = ['full_transcript', 'meeting_minutes']
+
+def iter_document_text(document: Document, file_path: str) -> Iterator[str]:
+    """Raw text of an uploaded document, in pieces (lines of text files, pages of PDFs)."""
+    if document.document_type in TEXT_DOCUMENT_TYPES:
+        return iter_text_lines(file_path)
+    # Assume it's a PDF for now for other document types
+    return iter_pdf_pages(file_path)
+
+def iter_document_chunks(document: Document, file_path: str) -> Iterator[Tuple[str, int]]:
+    """
+    Non-blank chunks of a document, read lazily, using the chunking strategy for its document_type,
+    as (content, overlap_chars) pairs; overlap_chars leading characters repeat the previous chunk.
+    """
+    return chunk_document_with_overlap(iter_document_text(document, file_path), document.document_type)
+
+def chunk_metadata(document: Document, chunk_number: int, content: str, overlap_chars: int = 0) -> dict:
+    return {
+        "chunk_number": chunk_number,
+        "filename": document.filename,
+        "token_count": estimate_tokens(content),
+        "overlap_chars": overlap_chars, # Used by rag_chat.pack_context to merge neighbouring chunks
+    }
+
+def _split_overlaps(batches: Iterable[List[Tuple[str, int]]], overlaps: deque) -> Iterator[List[str]]:
+    """Yields the contents of (content, overlap_chars) batches and queues each batch's overlaps."""
+    for batch in batches:
+        overlaps.append([overlap_chars for _, overlap_chars in batch])
+        yield [content for content, _ in batch]
 
 def ingest_document_pipeline(document_id: int, file_path: str, db: Session, collection: Optional[str] = None):
     """
-    Orchestrates the document ingestion process:
-    Parses, normalizes, chunks, embeds, and stores in the database.
+    Orchestrates the document ingestion process as a streaming pipeline:
+    pages/blocks of text are cleaned and chunked as they are read, embedded in batches of
+    INGEST_BATCH_SIZE chunks, and each batch is written to document_chunks as soon as it is
+    embedded. Peak memory is bounded by the batch size, not the document size.
+
+    Ingestion is checkpointed: each batch is committed together with the document's
+    indexed_chunk_count/last_completed_batch. After a failure the source file is kept, and
+    running the pipeline again (retry endpoint, or a redelivered task) skips the chunks that
+    are already stored and continues with the next batch. Only a document that is INDEXING
+    resumes; any other status starts from the first chunk, and a COMPLETED document (e.g. a
+    duplicate delivery of the task) is left alone.
     """
     document = None
     try:
         document = db.query(Document).filter(Document.id == document_id).first()
         if not document:
+            if os.path.exists(file_path):
+                os.remove(file_path)
             raise ValueError(f"Document with ID {document_id} not found.")
         
+        if document.status == DocumentStatus.COMPLETED:
+            print(f"Document {document_id} is already ingested; skipping.")
+            return
+
         # Set the collection for the document if provided
         if collection:
             document.collection = collection
-            
+
+        # The checkpoint is only valid for an ingestion of this file that was interrupted or is being retried.
+        resume_from = (document.indexed_chunk_count or 0) if document.status == DocumentStatus.INDEXING else 0
         document.status = DocumentStatus.INDEXING
+        document.source_path = file_path
+        document.error_message = None
+        if resume_from:
+            document.progress_text = f"Resuming after batch {document.last_completed_batch} ({resume_from} chunks already indexed)"
+        else:
+            # Starting over: clear any chunks an earlier attempt left behind.
+            db.query(DocumentChunk).filter(DocumentChunk.document_id == document.id).delete(synchronize_session=False)
+            document.indexed_chunk_count = 0
+            document.last_completed_batch = 0
+            document.progress_text = "Extracting text"
         db.commit()
 
-        raw_text = ""
-        if document.document_type in ['full_transcript', 'meeting_minutes']:
-            with open(file_path, "r", encoding="utf-8") as f:
-                raw_text = f.read()
-        else: # Assume it's a PDF for now for other document types
-            raw_text = extract_text_from_pdf(file_path)
-        
-        # APPLY CLEANING
-        cleaned_text = clean_text(raw_text)
-        
-        chunks = split_text(cleaned_text)
-        
-        if not chunks:
+        # Read -> clean -> chunk, lazily; blank chunks are skipped like in generate_embeddings.
+        # Chunking is deterministic, so the first resume_from chunks are the ones already stored.
+        chunks = islice(iter_document_chunks(document, file_path), resume_from, None)
+
+        # Cached chunks are reused, the rest are embedded several batches at a time; results come back in order.
+        chunk_count = resume_from
+        overlaps = deque()
+        batches = _split_overlaps(iter_batches(chunks, INGEST_BATCH_SIZE), overlaps)
+        for batch, embeddings in embed_batches_cached(batches, db):
+            batch_overlaps = overlaps.popleft()
+            logger.debug("Embedded chunks %d to %d of document %d", chunk_count, chunk_count + len(batch), document_id)
+
+            write_document_chunks([
+                {
+                    "document_id": document.id,
+                    "content": chunk_content,
+                    "embedding": embeddings[i],
+                    "chunk_metadata": chunk_metadata(document, chunk_count + i, chunk_content, batch_overlaps[i]),
+                }
+                for i, chunk_content in enumerate(batch)
+            ], db) # binary COPY
+            chunk_count += len(batch)
+            document.indexed_chunk_count = chunk_count
+            document.last_completed_batch += 1
+            document.progress_text = f"Embedding: batch {document.last_completed_batch} done, {chunk_count} chunks indexed"
+            db.commit() # Checkpoint; each batch becomes searchable as soon as it is stored
+
+        if chunk_count == 0:
             print(f"Warning: Document {document_id} resulted in no text chunks after cleaning and splitting.")
-            document.status = DocumentStatus.COMPLETED
-            db.commit()
-            return
 
-        embeddings, valid_chunks = generate_embeddings(chunks)
+        document.status = DocumentStatus.COMPLETED
+        document.progress_text = f"Completed: {chunk_count} chunks indexed"
+        document.source_path = None
+        bump_corpus_version(document.collection, db) # Invalidate cached answers for this collection
+        db.commit()
+        print(f"Document {document_id} ingested successfully with {chunk_count} chunks.")
+
+        # The source is only needed for resuming, so it goes once the document is complete.
+        if os.path.exists(file_path):
+            os.remove(file_path)
 
-        if not embeddings:
-            print(f"Warning: No embeddings were generated for document {document_id}.")
-            document.status = DocumentStatus.COMPLETED
-            db.commit()
-            return
-            
-        new_chunks = []
-        for i, chunk_content in enumerate(valid_chunks):
-            new_chunk = DocumentChunk(
-                document_id=document.id,
-                content=chunk_content,
-                embedding=embeddings[i],
-                chunk_metadata={"chunk_number": i, "filename": document.filename},
+    except Exception as e:
+        print(f"Error ingesting document {document_id}: {e}")
+        db.rollback()
+        if document:
+            # Committed batches stay (they are valid chunks) and the source file is kept for a retry.
+            document.status = DocumentStatus.FAILED
+            document.error_message = str(e)
+            document.progress_text = (
+                f"Failed after batch {document.last_completed_batch} ({document.indexed_chunk_count} chunks indexed); "
+                "a retry resumes from there"
             )
-            new_chunks.append(new_chunk)
-        db.bulk_save_objects(new_chunks)
+            db.commit()
+        raise
+
+def reindex_document_pipeline(document_id: int, file_path: str, db: Session):
+    """
+    Incrementally re-indexes an already ingested document from new text (used for edited
+    meeting transcripts). The new text is chunked the same way as on ingestion and each chunk's
+    content hash is compared with the stored chunks: unchanged chunks keep their rows and
+    embeddings (only their chunk_number is updated), new chunks are embedded and inserted, and
+    chunks that no longer occur are deleted. All changes are committed in one transaction.
+    """
+    document = None
+    try:
+        document = db.query(Document).filter(Document.id == document_id).first()
+        if not document:
+            raise ValueError(f"Document with ID {document_id} not found.")
+        document.status = DocumentStatus.INDEXING
         db.commit()
 
+        task_type = document_embedder.task_type
+        existing = {}
+        for row in (
+            db.query(DocumentChunk.id, DocumentChunk.content, DocumentChunk.chunk_metadata)
+            .filter(DocumentChunk.document_id == document.id)
+            .order_by(DocumentChunk.id)
+        ):
+            existing.setdefault(chunk_content_hash(row.content, task_type), []).append(row)
+
+        metadata_updates = []
+        new_chunks = [] # (chunk_number, content, overlap_chars)
+        chunk_count = 0
+        for chunk_number, (chunk, overlap_chars) in enumerate(iter_document_chunks(document, file_path)):
+            chunk_count += 1
+            rows = existing.get(chunk_content_hash(chunk, task_type))
+            if not rows:
+                new_chunks.append((chunk_number, chunk, overlap_chars))
+                continue
+            row = rows.pop(0)
+            metadata = chunk_metadata(document, chunk_number, row.content, overlap_chars)
+            if row.chunk_metadata != metadata:
+                metadata_updates.append({"id": row.id, "chunk_metadata": metadata})
+        removed_ids = [row.id for rows in existing.values() for row in rows]
+
+        logger.debug(
+            "Re-indexing document %d: %d chunks unchanged, %d to embed, %d to delete.",
+            document_id, chunk_count - len(new_chunks), len(new_chunks), len(removed_ids),
+        )
+
+        if removed_ids:
+            db.query(DocumentChunk).filter(DocumentChunk.id.in_(removed_ids)).delete(synchronize_session=False)
+        if metadata_updates:
+            db.bulk_update_mappings(DocumentChunk, metadata_updates)
+
+        chunk_positions = iter((chunk_number, overlap_chars) for chunk_number, _, overlap_chars in new_chunks)
+        batches = iter_batches((chunk for _, chunk, _ in new_chunks), INGEST_BATCH_SIZE)
+        for batch, embeddings in embed_batches_cached(batches, db):
+            rows = []
+            for i, chunk_content in enumerate(batch):
+                chunk_number, overlap_chars = next(chunk_positions)
+                rows.append({
+                    "document_id": document.id,
+                    "content": chunk_content,
+                    "embedding": embeddings[i],
+                    "chunk_metadata": chunk_metadata(document, chunk_number, chunk_content, overlap_chars),
+                })
+            write_document_chunks(rows, db)
+
         document.status = DocumentStatus.COMPLETED
+        document.indexed_chunk_count = chunk_count
+        document.progress_text = f"Re-indexed: {len(new_chunks)} chunks embedded, {len(removed_ids)} removed"
+        document.error_message = None
+        document.source_path = None
+        if new_chunks or removed_ids:
+            bump_corpus_version(document.collection, db) # Invalidate cached answers for this collection
         db.commit()
-        print(f"Document {document_id} ingested successfully with {len(new_chunks)} chunks.")
+        print(f"Document {document_id} re-indexed: {chunk_count} chunks.")
 
     except Exception as e:
-        print(f"Error ingesting document {document_id}: {e}")
+        print(f"Error re-indexing document {document_id}: {e}")
+        db.rollback()
         if document:
+            # The previous index is untouched, since nothing was committed.
             document.status = DocumentStatus.FAILED
+            document.error_message = str(e)
+            document.progress_text = "Re-indexing failed; ingest the transcript again to retry"
+            document.source_path = None
             db.commit()
         raise
     finally:
         if os.path.exists(file_path):
-            os.remove(file_path)
\ No newline at end of file
+            os.remove(file_path)
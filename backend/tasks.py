@@ -1,16 +1,24 @@
-from celery import Celery
+from celery import Celery, group
 from sqlalchemy.orm import Session
 from models import TranscriptionJob, TranscriptionJobStatus, User # Import User for user_id foreign key
-from sqlalchemy import create_engine
+from transcription_scheduler import dispatch_transcription_jobs
+from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker
 import os
 import subprocess
 import requests
 import json
+import re
+import threading
 import time
+from contextlib import closing
+from datetime import datetime, timezone
+from math import ceil
 from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Tuple
 import uuid
 import logging
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
 # Configure logging for the Celery worker
 logging.basicConfig(level=logging.INFO)
@@ -39,13 +47,60 @@ celery_app = Celery(
     backend=os.getenv("CELERY_RESULT_BACKEND", "redis://redis:6379/0")
 )
 
+# --- Queues ---
+# Document ingestion runs on its own queue (and its own workers, see docker-compose.yml);
+# transcription and minutes stay on Celery's default queue.
+INGEST_QUEUE = os.getenv("INGEST_QUEUE", "ingestion")
+# 0 is the highest priority with the Redis broker.
+INGEST_TASK_PRIORITY = int(os.getenv("INGEST_TASK_PRIORITY", 5))
+# Redis re-delivers an unacknowledged message after this long. Ingestion tasks are acks_late,
+# so it must be longer than the slowest ingestion (Celery's default is one hour).
+BROKER_VISIBILITY_TIMEOUT_SECONDS = int(os.getenv("BROKER_VISIBILITY_TIMEOUT_SECONDS", 6 * 60 * 60))
+# pg_try_advisory_lock(INGEST_LOCK_ID, document_id) key: one ingestion per document at a time.
+INGEST_LOCK_ID = 7263514
+
+CELERY_QUEUE_SETTINGS = {
+    "task_routes": {"tasks.ingest_document_task": {"queue": INGEST_QUEUE}},
+    # Redis only honours message priorities with these transport options.
+    "broker_transport_options": {
+        "priority_steps": list(range(10)),
+        "queue_order_strategy": "priority",
+        "visibility_timeout": BROKER_VISIBILITY_TIMEOUT_SECONDS,
+    },
+}
+celery_app.conf.update(CELERY_QUEUE_SETTINGS)
+
 # --- Constants ---
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 if not GEMINI_API_KEY:
     raise ValueError("GEMINI_API_KEY environment variable not set.")
 
 GEMINI_TRANSCRIPTION_MODEL = "gemini-2.5-flash" # As per user's request
+TRANSCRIBE_SEGMENT_SECONDS = int(os.getenv("TRANSCRIBE_SEGMENT_SECONDS", 600))
+# Start transcribing segments while ffmpeg is still splitting the recording.
+TRANSCRIBE_PIPELINED = os.getenv("TRANSCRIBE_PIPELINED", "true").lower() == "true"
+TRANSCRIBE_SEGMENT_POLL_SECONDS = 1.0
+TRANSCRIBE_AUDIO_PROFILE = os.getenv("TRANSCRIBE_AUDIO_PROFILE", "speech_opus") # see AUDIO_ENCODING_PROFILES
+# "fixed": plain TRANSCRIBE_SEGMENT_SECONDS cuts, pipelined with transcription (see TRANSCRIBE_PIPELINED).
+# "silence" (opt-in): cut at pauses and skip long silences (see plan_segments). It needs a full
+# silencedetect decode before the first segment and one ffmpeg run per segment, so it only pays
+# off for recordings with long silent stretches.
+TRANSCRIBE_SEGMENTATION = os.getenv("TRANSCRIBE_SEGMENTATION", "fixed").lower()
+TRANSCRIBE_SILENCE_NOISE_DB = int(os.getenv("TRANSCRIBE_SILENCE_NOISE_DB", -35))
+TRANSCRIBE_SILENCE_MIN_SECONDS = float(os.getenv("TRANSCRIBE_SILENCE_MIN_SECONDS", 0.5)) # shortest pause worth cutting at
+TRANSCRIBE_SKIP_SILENCE_SECONDS = float(os.getenv("TRANSCRIBE_SKIP_SILENCE_SECONDS", 20)) # longer silences are not uploaded
+TRANSCRIBE_CUT_WINDOW_SECONDS = float(os.getenv("TRANSCRIBE_CUT_WINDOW_SECONDS", 60))
+TRANSCRIPTION_PROMPT = "Professional Secretary. Transcribe Burmese/English CLEAN VERBATIM. MANDATORY: Start every turn with Speaker 1: or S>"
+# Segments transcribed at once within one job (1 = one after another).
+TRANSCRIBE_CONCURRENCY = max(1, int(os.getenv("TRANSCRIBE_CONCURRENCY", 4)))
+TRANSCRIBE_SEGMENT_MAX_RETRIES = int(os.getenv("TRANSCRIBE_SEGMENT_MAX_RETRIES", 3))
+TRANSCRIBE_REQUEST_TIMEOUT = int(os.getenv("TRANSCRIBE_REQUEST_TIMEOUT", 600))
+# How often a running job refreshes updated_at while segments (or their retries) are in flight;
+# the scheduler fails PROCESSING jobs whose heartbeat is TRANSCRIBE_STALE_JOB_MINUTES old.
+TRANSCRIBE_HEARTBEAT_SECONDS = int(os.getenv("TRANSCRIBE_HEARTBEAT_SECONDS", 60))
 UPLOAD_DIR = Path("/app/uploads") # Matches the FastAPI app
+# Files waiting for ingestion; on the uploads volume so API and ingestion workers share them.
+INGEST_UPLOAD_DIR = UPLOAD_DIR / "ingest"
 
 # --- Prompt Templates for Minutes Generation ---
 CEO_TONE_PROMPT_TEMPLATE = """ROLE:
@@ -243,7 +298,369 @@ def delete_gemini_file(file_name: str):
         logger.warning(f"Failed to delete Gemini file {file_name}: {e}")
 
 
+# --- Audio encoding profiles ---
+# Segments only need to carry speech: 16 kHz mono is what speech models work at, and it is
+# 5-10x smaller than the stereo ~190 kbps MP3 of "mp3_high". Compare profiles with
+# benchmarks/audio_encoding_benchmark.py.
+AUDIO_ENCODING_PROFILES = {
+    "speech_opus": {
+        "extension": ".ogg",
+        "mime_type": "audio/ogg",
+        "args": ["-ac", "1", "-ar", "16000", "-c:a", "libopus", "-b:a", "24k", "-application", "voip"],
+    },
+    "speech_mp3": {
+        "extension": ".mp3",
+        "mime_type": "audio/mpeg",
+        "args": ["-ac", "1", "-ar", "16000", "-c:a", "libmp3lame", "-b:a", "32k"],
+    },
+    "mp3_high": {
+        "extension": ".mp3",
+        "mime_type": "audio/mpeg",
+        "args": ["-c:a", "libmp3lame", "-q:a", "2"], # The original encoding
+    },
+}
+
+
+def get_audio_encoding_profile(name: str) -> dict:
+    if name not in AUDIO_ENCODING_PROFILES:
+        raise ValueError(f"Unknown audio encoding profile '{name}'")
+    return AUDIO_ENCODING_PROFILES[name]
+
+
+# --- Audio segmentation ---
+def probe_duration_seconds(file_path: Path) -> Optional[float]:
+    """Duration of an audio file according to ffprobe, or None if it can't be read."""
+    try:
+        result = subprocess.run(
+            ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "default=noprint_wrappers=1:nokey=1", str(file_path)],
+            check=True, capture_output=True, text=True, timeout=60,
+        )
+        return float(result.stdout.strip())
+    except (OSError, subprocess.SubprocessError, ValueError):
+        return None
+
+
+SILENCE_START = re.compile(r"silence_start: (-?[\d.]+)")
+SILENCE_END = re.compile(r"silence_end: (-?[\d.]+)")
+
+
+def detect_silences(file_path: Path) -> Optional[List[Tuple[float, float]]]:
+    """
+    (start, end) seconds of the pauses ffmpeg's silencedetect finds in the file, or None if
+    the detection pass fails. A silence running to the end of the file has end = inf.
+    """
+    command = [
+        "ffmpeg", "-nostats", "-i", str(file_path),
+        "-af", f"silencedetect=noise={TRANSCRIBE_SILENCE_NOISE_DB}dB:d={TRANSCRIBE_SILENCE_MIN_SECONDS}",
+        "-f", "null", "-",
+    ]
+    try:
+        result = subprocess.run(command, check=True, capture_output=True, text=True)
+    except (OSError, subprocess.CalledProcessError) as e:
+        logger.warning(f"Silence detection failed for {file_path}, using fixed segments: {e}")
+        return None
+    silences = []
+    start = None
+    for line in result.stderr.splitlines():
+        match = SILENCE_START.search(line)
+        if match:
+            start = max(0.0, float(match.group(1)))
+            continue
+        match = SILENCE_END.search(line)
+        if match and start is not None:
+            silences.append((start, float(match.group(1))))
+            start = None
+    if start is not None:
+        silences.append((start, float("inf")))
+    return silences
+
+
+def plan_segments(duration: float, silences: List[Tuple[float, float]]) -> List[Tuple[float, float]]:
+    """
+    (start, end) seconds of the segments to transcribe. Silences of at least
+    TRANSCRIBE_SKIP_SILENCE_SECONDS are left out, and the speech between them is cut into
+    segments of about TRANSCRIBE_SEGMENT_SECONDS at the pause nearest to each target cut,
+    within TRANSCRIBE_CUT_WINDOW_SECONDS either side (at the target itself if there is none).
+    """
+    padding = 0.25 # keep a little of the silence around speech so words aren't clipped
+    spans = []
+    position = 0.0
+    for start, end in silences:
+        if end - start < TRANSCRIBE_SKIP_SILENCE_SECONDS:
+            continue
+        if start - position >= 1.0:
+            spans.append((position, min(start + padding, duration)))
+        position = max(position, end - padding)
+    if duration - position >= 1.0:
+        spans.append((position, duration))
+
+    pauses = [(start + end) / 2 for start, end in silences if end != float("inf")]
+    target, window = TRANSCRIBE_SEGMENT_SECONDS, TRANSCRIBE_CUT_WINDOW_SECONDS
+    segments = []
+    for start, end in spans:
+        while end - start > target + window:
+            goal = start + target
+            nearby = [pause for pause in pauses if goal - window <= pause <= goal + window]
+            cut = min(nearby, key=lambda pause: abs(pause - goal)) if nearby else goal
+            segments.append((start, cut))
+            start = cut
+        segments.append((start, end))
+    return segments
+
+
+def fixed_segment_plan(duration: float) -> List[Tuple[float, float]]:
+    """The segments ffmpeg's segment muxer makes with -segment_time TRANSCRIBE_SEGMENT_SECONDS."""
+    return [
+        (start, min(start + TRANSCRIBE_SEGMENT_SECONDS, duration))
+        for start in range(0, ceil(duration), TRANSCRIBE_SEGMENT_SECONDS)
+    ]
+
+
+def segment_offsets(plan: List[Tuple[float, float]]) -> List[dict]:
+    """Segment offsets as stored in TranscriptionJob.segment_offsets."""
+    return [{"index": index, "start": round(start, 2), "end": round(end, 2)} for index, (start, end) in enumerate(plan)]
+
+
+def iter_planned_segments(file_path: Path, plan: List[Tuple[float, float]], segment_pattern: Path, encode_args: List[str]) -> Iterator[Path]:
+    """Encodes the planned segments one at a time, yielding each as soon as it's written."""
+    for index, (start, end) in enumerate(plan):
+        segment_path = Path(str(segment_pattern) % index)
+        subprocess.run(
+            ["ffmpeg", "-y", "-ss", f"{start:.3f}", "-t", f"{end - start:.3f}", "-i", str(file_path), *encode_args, str(segment_path)],
+            check=True, capture_output=True, text=True,
+        )
+        yield segment_path
+
+
+def _read_segment_list(segment_list: Path) -> List[str]:
+    """File names from a CSV segment list, ignoring a last line ffmpeg is still writing."""
+    if not segment_list.exists():
+        return []
+    lines = segment_list.read_text(encoding="utf-8", errors="replace").split("\n")[:-1]
+    return [line.split(",")[0] for line in lines if line]
+
+
+def iter_ffmpeg_segments(ffmpeg_command: List[str], segment_pattern: Path) -> Iterator[Path]:
+    """
+    Runs an ffmpeg segment muxer command (output pattern last) in the background and yields
+    each segment as soon as ffmpeg has finished it, while ffmpeg goes on encoding the rest.
+    Finished segments are read from the -segment_list ffmpeg keeps; a listed segment counts
+    as closed once the next segment file has been opened or ffmpeg has exited.
+    Raises subprocess.CalledProcessError if ffmpeg fails. Closing the generator stops ffmpeg.
+    """
+    segment_dir = segment_pattern.parent
+    segment_list = segment_dir / "segments.csv"
+    log_path = segment_dir / "ffmpeg.log"
+    command = [*ffmpeg_command[:-1], "-segment_list", str(segment_list), "-segment_list_type", "csv", ffmpeg_command[-1]]
+    with open(log_path, "w") as log:
+        process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=log)
+    produced = 0
+    try:
+        while True:
+            finished = process.poll() is not None
+            names = _read_segment_list(segment_list)
+            while produced < len(names):
+                if not finished and not Path(str(segment_pattern) % (produced + 1)).exists():
+                    break
+                yield segment_dir / names[produced]
+                produced += 1
+            if finished:
+                break
+            time.sleep(TRANSCRIBE_SEGMENT_POLL_SECONDS)
+        if process.returncode != 0:
+            stderr = log_path.read_text(errors="replace")[-4000:]
+            raise subprocess.CalledProcessError(process.returncode, command, stderr=stderr)
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+
+
+# --- Segment transcription ---
+class SegmentTranscriptionError(Exception):
+    pass
+
+
+def transcribe_segment(segment_path: Path, mime_type: str, display_name: str) -> str:
+    """Uploads one audio segment, transcribes it with Gemini and deletes the uploaded file."""
+    gemini_file_uri = None
+    try:
+        gemini_file_uri = upload_file_to_gemini(segment_path, mime_type, display_name)
+
+        # Transcription request to Gemini REST API
+        transcribe_url = f"https://generativelanguage.googleapis.com/v1beta/models/{GEMINI_TRANSCRIPTION_MODEL}:generateContent"
+        transcribe_headers = {
+            "x-goog-api-key": GEMINI_API_KEY,
+            "Content-Type": "application/json",
+        }
+        transcribe_payload = json.dumps({
+            "contents": [{"parts": [
+                    {"text": TRANSCRIPTION_PROMPT},
+                    {"file_data": {"mime_type": mime_type, "file_uri": gemini_file_uri}}
+                ]}]
+        })
+
+        transcribe_response = requests.post(
+            transcribe_url, headers=transcribe_headers, data=transcribe_payload, timeout=TRANSCRIBE_REQUEST_TIMEOUT
+        )
+        transcribe_response.raise_for_status()
+        transcription_result = transcribe_response.json()
+
+        # Extract text from the Gemini response
+        segment_transcript = ""
+        for candidate in transcription_result.get("candidates", []):
+            for part in candidate.get("content", {}).get("parts", []):
+                if "text" in part:
+                    segment_transcript += part["text"]
+        return segment_transcript
+    finally:
+        # Clean up Gemini file
+        if gemini_file_uri:
+            # gemini_file_uri is "https://generativelanguage.googleapis.com/v1beta/files/..."
+            # we need "files/..."
+            delete_gemini_file(gemini_file_uri.split("/v1beta/")[1])
+
+
+def transcribe_segment_with_retry(
+    segment_path: Path, mime_type: str, display_name: str, stop: Optional[threading.Event] = None
+) -> str:
+    """
+    transcribe_segment, retried with exponential backoff; a failure only repeats this one segment.
+    Setting `stop` ends the backoff early and gives up on the segment.
+    """
+    stop = stop or threading.Event()
+    for attempt in range(TRANSCRIBE_SEGMENT_MAX_RETRIES + 1):
+        try:
+            return transcribe_segment(segment_path, mime_type, display_name)
+        except Exception as e:
+            if attempt == TRANSCRIBE_SEGMENT_MAX_RETRIES:
+                raise
+            delay = min(60, 5 * 2 ** attempt)
+            logger.warning(f"{display_name} failed (attempt {attempt + 1}): {e}; retrying in {delay}s")
+            if stop.wait(delay):
+                raise
+
+
+def transcribe_segments_in_order(job: TranscriptionJob, db: Session, segments: Iterable[Path], mime_type: str, total_segments: Optional[int] = None):
+    """
+    Transcribes audio segments with up to TRANSCRIBE_CONCURRENCY in flight and reassembles
+    them in segment order: job.full_transcript always holds the finished prefix of segments,
+    so partial results read the same as with sequential processing. Segments are pulled from
+    the iterable lazily. Each segment file is deleted once it has been transcribed.
+    All DB updates happen on the calling thread, which also refreshes job.updated_at after
+    every segment and at least every TRANSCRIBE_HEARTBEAT_SECONDS while segments are uploading
+    or waiting to retry. Returns (or raises) only once no segment is being read any more, so
+    the caller can remove the segment directory afterwards.
+    """
+    segments = iter(enumerate(segments))
+    results = {}
+    in_flight = {}
+    next_to_write = 0
+    stop = threading.Event()
+    pool = ThreadPoolExecutor(max_workers=TRANSCRIBE_CONCURRENCY, thread_name_prefix=f"transcribe-{job.id}")
+
+    def submit_next() -> bool:
+        item = next(segments, None)
+        if item is None:
+            return False
+        index, segment_path = item
+        future = pool.submit(transcribe_segment_with_retry, segment_path, mime_type, f"job_{job.id}_chunk_{index + 1}", stop)
+        in_flight[future] = (index, segment_path)
+        return True
+
+    try:
+        for _ in range(TRANSCRIBE_CONCURRENCY):
+            if not submit_next():
+                break
+        while in_flight:
+            done, _ = wait(in_flight, timeout=TRANSCRIBE_HEARTBEAT_SECONDS, return_when=FIRST_COMPLETED)
+            for future in done:
+                index, segment_path = in_flight.pop(future)
+                try:
+                    results[index] = future.result()
+                except Exception as e:
+                    raise SegmentTranscriptionError(
+                        f"Chunk {index + 1} failed after {TRANSCRIBE_SEGMENT_MAX_RETRIES + 1} attempts: {e}"
+                    ) from e
+                finally:
+                    # Clean up local chunk file
+                    segment_path.unlink(missing_ok=True)
+                logger.info(f"Transcribed chunk {index + 1} for job {job.id}")
+                submit_next()
+
+            while next_to_write in results:
+                next_to_write += 1
+            job.full_transcript = "\n".join(results[i] for i in range(next_to_write))
+            if total_segments:
+                # total_segments may be an estimate (pipelined mode), so never report past the real count
+                total = max(total_segments, len(results) + len(in_flight))
+                job.progress_percent = int(len(results) / total * 100)
+                job.progress_text = f"Transcribed {len(results)} of {total} chunks..."
+            else:
+                job.progress_text = f"Transcribed {len(results)} chunks..."
+            job.updated_at = datetime.now(timezone.utc) # Heartbeat, see transcription_scheduler._fail_stale_jobs
+            db.commit()
+    finally:
+        # On failure, queued segments are dropped and running ones stop retrying; still wait for
+        # the uploads in progress, since the caller deletes their files next.
+        stop.set()
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
 # --- Celery Tasks ---
+@celery_app.task(bind=True, acks_late=True, reject_on_worker_lost=True)
+def ingest_document_task(self, document_id: int, file_path: str, collection: Optional[str] = None, incremental: bool = False):
+    """
+    Runs the document ingestion pipeline on an ingestion worker. acks_late means a task
+    interrupted by a worker restart is delivered again instead of being lost.
+    With incremental=True an already indexed document is re-indexed from the new text.
+
+    The document's advisory lock is held on a separate connection for the whole run, so a
+    copy of the task delivered while the original is still running returns without doing
+    anything. The lock goes with the connection if the worker dies, and the redelivered
+    task resumes from the checkpoint.
+    """
+    from rag_pipeline import ingest_document_pipeline, reindex_document_pipeline
+
+    with engine.connect() as lock_conn:
+        locked = lock_conn.execute(
+            text("SELECT pg_try_advisory_lock(:key, :document_id)"), {"key": INGEST_LOCK_ID, "document_id": document_id}
+        ).scalar()
+        lock_conn.commit()
+        if not locked:
+            logger.warning(f"Document {document_id} is already being ingested by another task; skipping this delivery.")
+            return
+        db = SessionLocal()
+        try:
+            if incremental:
+                reindex_document_pipeline(document_id, file_path, db)
+            else:
+                ingest_document_pipeline(document_id, file_path, db, collection=collection)
+        finally:
+            db.close()
+            lock_conn.execute(
+                text("SELECT pg_advisory_unlock(:key, :document_id)"), {"key": INGEST_LOCK_ID, "document_id": document_id}
+            )
+            lock_conn.commit()
+
+
+def enqueue_document_ingestions(documents: List[Tuple[int, str]], collection: Optional[str] = None):
+    """Queues many (document_id, file_path) ingestions in one group, sent over a single broker connection."""
+    return group(
+        ingest_document_task.si(document_id, file_path, collection).set(queue=INGEST_QUEUE, priority=INGEST_TASK_PRIORITY)
+        for document_id, file_path in documents
+    ).apply_async()
+
+
+def enqueue_document_ingestion(document_id: int, file_path: str, collection: Optional[str] = None, incremental: bool = False):
+    """Queues a document for ingestion; file_path must be on the shared uploads volume."""
+    return ingest_document_task.apply_async(
+        args=[document_id, file_path, collection, incremental],
+        queue=INGEST_QUEUE,
+        priority=INGEST_TASK_PRIORITY,
+    )
+
+
 @celery_app.task(bind=True)
 def transcribe_audio_task(self, job_id: int, audio_file_path: str):
     db = None
@@ -255,104 +672,81 @@ def transcribe_audio_task(self, job_id: int, audio_file_path: str):
             logger.error(f"Transcription job {job_id} not found.")
             return
 
-        job.status = TranscriptionJobStatus.PROCESSING
-        job.progress_text = "Splitting audio into chunks..."
+        # Start the job only if it is still PENDING and dispatched with this task's id: it may have
+        # been cancelled, or requeued and sent again by the scheduler after a dispatch timeout.
+        started = db.query(TranscriptionJob).filter(
+            TranscriptionJob.id == job_id,
+            TranscriptionJob.status == TranscriptionJobStatus.PENDING,
+            TranscriptionJob.celery_task_id == self.request.id,
+        ).update(
+            {TranscriptionJob.status: TranscriptionJobStatus.PROCESSING, TranscriptionJob.progress_text: "Splitting audio into chunks..."},
+            synchronize_session=False,
+        )
         db.commit()
+        if not started:
+            logger.warning(f"Transcription job {job_id} is {job.status.value} or was dispatched again; not starting it.")
+            return
+        db.refresh(job)
         
         original_file_path = Path(audio_file_path)
         chunk_dir = original_file_path.parent / f"chunks_{job_id}"
         chunk_dir.mkdir(exist_ok=True)
 
-        file_extension = original_file_path.suffix
-        chunk_prefix = chunk_dir / f"chunk_{job_id}_%03d{file_extension}"
-        
         # FFmpeg command to split audio into 10-minute (600 seconds) chunks
         # The original example used 900s, user mentioned 10 min (600s). Let's use 600s.
-        # It's better to convert to mp3 if not already, to ensure consistent MIME type
-        output_format = ".mp3" if file_extension.lower() not in [".mp3", ".wav"] else file_extension
+        # Segments are re-encoded with the configured profile, so the MIME type is always known
+        profile = get_audio_encoding_profile(TRANSCRIBE_AUDIO_PROFILE)
+        output_format = profile["extension"]
         final_chunk_prefix = chunk_dir / f"chunk_{job_id}_%03d{output_format}"
+        encode_args = ["-vn", *profile["args"]]
         ffmpeg_command = [
             "ffmpeg",
             "-i", str(original_file_path),
             "-f", "segment",
-            "-segment_time", "600", # 10 minutes
-            "-c:a", "libmp3lame", # Encode to MP3 for wider Gemini support
-            "-q:a", "2", # Good quality
+            "-segment_time", str(TRANSCRIBE_SEGMENT_SECONDS), # 10 minutes
+            *encode_args,
             str(final_chunk_prefix)
         ]
-        
-        logger.info(f"Executing ffmpeg command: {' '.join(ffmpeg_command)}")
-        subprocess.run(ffmpeg_command, check=True, capture_output=True, text=True)
+        chunk_mime_type = profile["mime_type"]
+        duration = probe_duration_seconds(original_file_path)
 
-        chunks = sorted(list(chunk_dir.glob(f"chunk_{job_id}_*{output_format}")))
-        total_chunks = len(chunks)
-        full_transcript_parts = []
-        
-        for i, chunk_path in enumerate(chunks):
-            current_chunk_number = i + 1
-            job.progress_percent = int((current_chunk_number / total_chunks) * 100)
-            job.progress_text = f"Transcribing chunk {current_chunk_number} of {total_chunks}..."
+        silences = None
+        if TRANSCRIBE_SEGMENTATION == "silence" and duration:
+            job.progress_text = "Detecting pauses..."
             db.commit()
-            logger.info(f"Processing chunk {current_chunk_number}/{total_chunks}: {chunk_path}")
-
-            gemini_file_uri = None
-            try:
-                # Determine MIME type for the chunk
-                # Assuming MP3 now due to libmp3lame encoding
-                chunk_mime_type = "audio/mpeg" if output_format == ".mp3" else "audio/wav" # Defaulting for common types
-                gemini_file_uri = upload_file_to_gemini(chunk_path, chunk_mime_type, f"job_{job_id}_chunk_{current_chunk_number}")
-                
-                # Transcription request to Gemini REST API
-                transcribe_url = f"https://generativelanguage.googleapis.com/v1beta/models/{GEMINI_TRANSCRIPTION_MODEL}:generateContent"
-                transcribe_headers = {
-                    "x-goog-api-key": GEMINI_API_KEY,
-                    "Content-Type": "application/json",
-                }
-                transcribe_payload = json.dumps({
-                    "contents": [{"parts": [
-                            {"text": "Professional Secretary. Transcribe Burmese/English CLEAN VERBATIM. MANDATORY: Start every turn with Speaker 1: or S>"},
-                            {"file_data": {"mime_type": chunk_mime_type, "file_uri": gemini_file_uri}}
-                        ]}]
-                })
-
-                transcribe_response = requests.post(transcribe_url, headers=transcribe_headers, data=transcribe_payload)
-                transcribe_response.raise_for_status()
-                transcription_result = transcribe_response.json()
-                
-                # Extract text from the Gemini response
-                chunk_transcript = ""
-                for candidate in transcription_result.get("candidates", []):
-                    for part in candidate.get("content", {}).get("parts", []):
-                        if "text" in part:
-                            chunk_transcript += part["text"]
-                
-                full_transcript_parts.append(chunk_transcript)
-                job.full_transcript = "\n".join(full_transcript_parts)
-                db.commit()
-                logger.info(f"Transcribed chunk {current_chunk_number} for job {job_id}")
-
-            except Exception as e:
-                logger.error(f"Error processing chunk {current_chunk_number} for job {job_id}: {e}")
-                job.error_message = (job.error_message or "") + f"Chunk {current_chunk_number} failed: {e}\n"
-                job.status = TranscriptionJobStatus.FAILED
-                db.commit()
-                # Optionally re-raise to fail the task, or continue with other chunks
-                raise # Re-raise to mark the Celery task as failed
-
-            finally:
-                # Clean up local chunk file
-                if chunk_path.exists():
-                    chunk_path.unlink()
-                # Clean up Gemini file
-                if gemini_file_uri:
-                    # gemini_file_uri is "https://generativelanguage.googleapis.com/v1beta/files/..."
-                    # we need "files/..."
-                    file_name_for_deletion = gemini_file_uri.split("/v1beta/")[1]
-                    delete_gemini_file(file_name_for_deletion)
+            silences = detect_silences(original_file_path)
+
+        if silences is not None:
+            # Cut at pauses and leave out long silent stretches; segments are encoded one by one
+            # while the earlier ones are being transcribed.
+            plan = plan_segments(duration, silences)
+            job.segment_offsets = segment_offsets(plan)
+            skipped_minutes = (duration - sum(end - start for start, end in plan)) / 60
+            job.progress_text = f"Transcribing {len(plan)} chunks ({skipped_minutes:.0f} min of silence skipped)..."
+            db.commit()
+            logger.info(f"Job {job_id}: {len(plan)} segments, skipping {skipped_minutes:.1f} min of silence")
+            with closing(iter_planned_segments(original_file_path, plan, final_chunk_prefix, encode_args)) as chunks:
+                transcribe_segments_in_order(job, db, chunks, chunk_mime_type, total_segments=len(plan))
+        elif TRANSCRIBE_PIPELINED:
+            # Transcribe each segment as soon as ffmpeg has written it
+            logger.info(f"Executing ffmpeg command: {' '.join(ffmpeg_command)}")
+            job.segment_offsets = segment_offsets(fixed_segment_plan(duration)) if duration else None
+            job.progress_text = "Splitting and transcribing audio..."
+            db.commit()
+            expected_chunks = ceil(duration / TRANSCRIBE_SEGMENT_SECONDS) if duration else None
+            with closing(iter_ffmpeg_segments(ffmpeg_command, final_chunk_prefix)) as chunks:
+                transcribe_segments_in_order(job, db, chunks, chunk_mime_type, total_segments=expected_chunks)
+        else:
+            logger.info(f"Executing ffmpeg command: {' '.join(ffmpeg_command)}")
+            job.segment_offsets = segment_offsets(fixed_segment_plan(duration)) if duration else None
+            subprocess.run(ffmpeg_command, check=True, capture_output=True, text=True)
+            chunks = sorted(list(chunk_dir.glob(f"chunk_{job_id}_*{output_format}")))
+            transcribe_segments_in_order(job, db, chunks, chunk_mime_type, total_segments=len(chunks))
 
         # Finalize job status
         job.status = TranscriptionJobStatus.COMPLETED
         job.progress_text = "Transcription completed."
+        job.finished_at = datetime.now(timezone.utc)
         db.commit()
         logger.info(f"Transcription job {job_id} completed successfully.")
 
@@ -362,6 +756,7 @@ def transcribe_audio_task(self, job_id: int, audio_file_path: str):
         if job:
             job.status = TranscriptionJobStatus.FAILED
             job.error_message = error_msg
+            job.finished_at = datetime.now(timezone.utc)
             db.commit()
     except requests.exceptions.RequestException as e:
         error_msg = f"Gemini API request failed for job {job_id}: {e}"
@@ -369,6 +764,7 @@ def transcribe_audio_task(self, job_id: int, audio_file_path: str):
         if job:
             job.status = TranscriptionJobStatus.FAILED
             job.error_message = error_msg
+            job.finished_at = datetime.now(timezone.utc)
             db.commit()
     except Exception as e:
         error_msg = f"An unexpected error occurred for job {job_id}: {e}"
@@ -376,6 +772,7 @@ def transcribe_audio_task(self, job_id: int, audio_file_path: str):
         if job:
             job.status = TranscriptionJobStatus.FAILED
             job.error_message = error_msg
+            job.finished_at = datetime.now(timezone.utc)
             db.commit()
     finally:
         # Clean up original uploaded file and chunk directory
@@ -390,6 +787,12 @@ def transcribe_audio_task(self, job_id: int, audio_file_path: str):
                 logger.warning(f"Could not remove chunk directory {chunk_dir}: {e}")
         if db:
             db.close()
+        # This job's slot is free now; start the next queued job
+        try:
+            with SessionLocal() as scheduler_db:
+                dispatch_transcription_jobs(scheduler_db)
+        except Exception as e:
+            logger.error(f"Failed to dispatch queued transcription jobs after job {job_id}: {e}")
 
 @celery_app.task(bind=True)
 def generate_minutes_task(self, job_id: int, meeting_date: str, meeting_time: str, tone: str, meeting_name: str):
@@ -0,0 +1,54 @@
+import io
+import json
+import struct
+
+from chunk_loader import encode_chunk_rows, encode_vector
+
+
+def read_copy_stream(data: bytes):
+    """Minimal binary COPY reader: a list of tuples of raw field bytes (None for NULL)."""
+    stream = io.BytesIO(data)
+    assert stream.read(11) == b"PGCOPY\n\xff\r\n\x00"
+    flags, extension_length = struct.unpack("!ii", stream.read(8))
+    assert (flags, extension_length) == (0, 0)
+    rows = []
+    while True:
+        (field_count,) = struct.unpack("!h", stream.read(2))
+        if field_count == -1:
+            assert stream.read() == b""
+            return rows
+        row = []
+        for _ in range(field_count):
+            (length,) = struct.unpack("!i", stream.read(4))
+            row.append(None if length == -1 else stream.read(length))
+        rows.append(tuple(row))
+
+
+def test_encode_vector_uses_pgvector_binary_format():
+    data = encode_vector([1.0, -2.5, 0.0])
+    assert struct.unpack("!HH", data[:4]) == (3, 0)
+    assert struct.unpack("!3f", data[4:]) == (1.0, -2.5, 0.0)
+
+
+def test_encode_chunk_rows_round_trips():
+    rows = [
+        {"document_id": 7, "content": "Hello", "embedding": [0.5, 0.25], "chunk_metadata": {"chunk_number": 0}},
+        {"document_id": 7, "content": "မင်္ဂလာပါ", "embedding": None, "chunk_metadata": None},
+    ]
+    decoded = read_copy_stream(encode_chunk_rows(rows))
+    assert len(decoded) == 2
+
+    document_id, content, embedding, metadata = decoded[0]
+    assert struct.unpack("!i", document_id) == (7,)
+    assert content.decode("utf-8") == "Hello"
+    assert embedding == encode_vector([0.5, 0.25])
+    assert json.loads(metadata) == {"chunk_number": 0}
+
+    _, content, embedding, metadata = decoded[1]
+    assert content.decode("utf-8") == "မင်္ဂလာပါ"
+    assert embedding is None
+    assert metadata is None
+
+
+def test_encode_chunk_rows_without_rows_is_header_and_trailer():
+    assert read_copy_stream(encode_chunk_rows([])) == []
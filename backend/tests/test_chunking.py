@@ -0,0 +1,84 @@
+import random
+
+import pytest
+
+from chunking import (
+    chunk_document,
+    clean_text,
+    get_chunking_strategy,
+    iter_chunks,
+    iter_clean_text,
+    pack_units,
+    pack_units_content_defined,
+    split_text,
+)
+
+
+def split_into_pieces(text, rng):
+    """Cuts text at random points, as pages or lines would arrive from a reader."""
+    cuts = sorted(rng.sample(range(1, len(text)), min(20, len(text) - 1)))
+    return [text[start:end] for start, end in zip([0] + cuts, cuts + [len(text)])]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_iter_chunks_matches_split_text_of_clean_text(seed):
+    rng = random.Random(seed)
+    words = ["alpha", "beta", "\x00", "  ", "\n\n", "\t", "မင်္ဂလာပါ", "gamma."]
+    text = " " + "".join(rng.choice(words) + rng.choice(["", " ", "\n"]) for _ in range(800))
+    pieces = split_into_pieces(text, rng)
+    assert list(iter_chunks(iter_clean_text(pieces), 300, 40)) == split_text(clean_text(text), 300, 40)
+
+
+@pytest.mark.parametrize("length", [0, 1, 299, 300, 301, 560, 561])
+def test_iter_chunks_matches_split_text_at_window_boundaries(length):
+    text = "x" * length
+    assert list(iter_chunks([text], 300, 40)) == split_text(text, 300, 40)
+
+
+def test_pack_units_keeps_units_whole_and_within_size():
+    units = [f"Sentence number {i}." for i in range(40)]
+    chunks = list(pack_units(units, chunk_size=100))
+    assert all(len(chunk) <= 100 for chunk in chunks)
+    assert " ".join(chunks) == " ".join(units)
+
+
+def test_pack_units_repeats_trailing_units_as_overlap():
+    units = ["aaaa", "bbbb", "cccc", "dddd", "eeee"]
+    chunks = list(pack_units(units, chunk_size=14, overlap=4))
+    assert chunks == ["aaaa bbbb cccc", "cccc dddd eeee"]
+
+
+def test_pack_units_splits_units_longer_than_a_chunk():
+    long_unit = " ".join(["word"] * 100)
+    chunks = list(pack_units([long_unit], chunk_size=50))
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 50 for chunk in chunks)
+    assert " ".join(chunks).split() == long_unit.split()
+
+
+def speaker_turns(count, start=0):
+    return [f"Speaker {i % 3 + 1}: point {i} about the agenda item" for i in range(start, start + count)]
+
+
+def test_pack_units_content_defined_respects_the_size_bounds():
+    chunks = list(pack_units_content_defined(speaker_turns(200), chunk_size=200))
+    assert all(len(chunk) <= 400 for chunk in chunks)
+    assert " ".join(chunks) == " ".join(speaker_turns(200))
+
+
+def test_pack_units_content_defined_is_stable_after_an_edit():
+    turns = speaker_turns(200)
+    edited = turns[:10] + ["Speaker 2: an inserted remark"] + turns[10:]
+    before = list(pack_units_content_defined(turns, chunk_size=200))
+    after = list(pack_units_content_defined(edited, chunk_size=200))
+    assert before != after
+    # Only the chunks around the edit change; the tail comes out identical.
+    assert before[-len(before) // 2:] == after[-len(before) // 2:]
+
+
+def test_general_documents_use_fixed_chunks_and_meetings_speaker_turns():
+    assert get_chunking_strategy("general_document") == "fixed"
+    assert get_chunking_strategy(None) == "fixed"
+    assert get_chunking_strategy("full_transcript") == "speaker_turn"
+    text = "word " * 500
+    assert list(chunk_document([text], "general_document")) == split_text(clean_text(text), 1000, 100)
@@ -0,0 +1,136 @@
+import pytest
+import requests
+
+import embedding_engine
+from embedding_engine import EmbeddingEngine, RateLimiter
+
+
+class FakeResponse:
+    def __init__(self, status_code, payload=None, headers=None):
+        self.status_code = status_code
+        self._payload = payload or {}
+        self.headers = headers or {}
+        self.text = str(self._payload)
+
+    def json(self):
+        return self._payload
+
+    def raise_for_status(self):
+        raise requests.HTTPError(f"HTTP {self.status_code}")
+
+
+class FakeSession:
+    """Answers batchEmbedContents calls from a list of responses (or a callable per request)."""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.batch_sizes = []
+
+    def post(self, url, params, json, timeout):
+        texts = [request["content"]["parts"][0]["text"] for request in json["requests"]]
+        self.batch_sizes.append(len(texts))
+        response = self.responses.pop(0) if self.responses else ok
+        if isinstance(response, Exception):
+            raise response
+        return response(texts) if callable(response) else response
+
+
+def ok(texts):
+    return FakeResponse(200, {"embeddings": [{"values": [float(len(text))]} for text in texts]})
+
+
+def too_large_over(limit):
+    def respond(texts):
+        if len(texts) > limit:
+            return FakeResponse(400, {"error": {"message": "Request payload size exceeds the limit"}})
+        return ok(texts)
+    return respond
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    monkeypatch.setenv("GEMINI_API_KEY", "test")
+    slept = []
+    monkeypatch.setattr(embedding_engine.time, "sleep", slept.append)
+    return slept
+
+
+def engine_with(responses, **kwargs):
+    engine = EmbeddingEngine(requests_per_minute=0, **kwargs)
+    engine._session = FakeSession(responses)
+    return engine
+
+
+def test_rate_limiter_spaces_request_starts(monkeypatch):
+    now = [100.0]
+    slept = []
+    monkeypatch.setattr(embedding_engine.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(embedding_engine.time, "sleep", slept.append)
+    limiter = RateLimiter(requests_per_minute=60)
+    for _ in range(3):
+        limiter.acquire()
+    assert slept == [1.0, 2.0]
+
+
+def test_rate_limiter_pause_delays_the_next_request(monkeypatch):
+    now = [100.0]
+    slept = []
+    monkeypatch.setattr(embedding_engine.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(embedding_engine.time, "sleep", slept.append)
+    limiter = RateLimiter(requests_per_minute=0)
+    limiter.pause(5.0)
+    limiter.acquire()
+    assert slept == [5.0]
+
+
+def test_retries_transient_failures_and_honours_retry_after(sleeps):
+    engine = engine_with([
+        requests.Timeout("timed out"),
+        FakeResponse(429, headers={"Retry-After": "30"}),
+        ok,
+    ])
+    assert engine.embed(["ab", "c"]) == [[2.0], [1.0]]
+    assert len(engine._session.batch_sizes) == 3
+    # Backoff after the timeout, Retry-After after the 429, then the 429's pause of the shared limiter.
+    assert len(sleeps) == 3
+    assert sleeps[1] == 30
+    assert sleeps[2] > 29
+
+
+def test_gives_up_after_max_retries(sleeps):
+    engine = engine_with([FakeResponse(503)] * 3, max_retries=2)
+    with pytest.raises(requests.HTTPError):
+        engine.embed(["a"])
+    assert len(sleeps) == 2
+
+
+def test_client_errors_are_not_retried(sleeps):
+    engine = engine_with([FakeResponse(403)])
+    with pytest.raises(requests.HTTPError):
+        engine.embed(["a"])
+    assert sleeps == []
+
+
+def test_oversized_batch_halves_batch_size_for_later_batches(sleeps):
+    engine = engine_with([too_large_over(25)] * 10)
+    texts = [str(i) for i in range(60)]
+    assert engine.embed(texts) == [[float(len(text))] for text in texts]
+    assert engine._session.batch_sizes == [60, 30, 15, 15, 15, 15]
+    assert engine.batch_size == 15
+    assert sleeps == []
+
+
+def test_single_text_too_large_is_raised(sleeps):
+    engine = engine_with([too_large_over(0)])
+    with pytest.raises(embedding_engine.PayloadTooLargeError):
+        engine.embed(["a"])
+
+
+def test_embed_batches_yields_in_input_order(sleeps):
+    engine = engine_with([], concurrency=3)
+    batches = [["a"], ["bb", "ccc"], ["dddd"]]
+    assert list(engine.embed_batches(batches)) == [
+        (["a"], [[1.0]]),
+        (["bb", "ccc"], [[2.0], [3.0]]),
+        (["dddd"], [[4.0]]),
+    ]
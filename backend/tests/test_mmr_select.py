@@ -0,0 +1,51 @@
+from rag_chat import RetrievedChunk, mmr_select
+
+
+def candidate(name, embedding):
+    return RetrievedChunk(
+        document_id=1,
+        content=name,
+        filename="doc.pdf",
+        chunk_number=None,
+        token_count=None,
+        distance=None,
+        embedding=embedding,
+    )
+
+
+def names(chunks):
+    return [chunk.content for chunk in chunks]
+
+
+QUERY = [1.0, 0.0]
+CANDIDATES = [
+    candidate("best", [1.0, 0.0]),
+    candidate("near duplicate", [0.99, 0.01]),
+    candidate("different", [0.6, 0.8]),
+]
+
+
+def test_returns_all_candidates_when_there_are_at_most_k():
+    assert names(mmr_select(QUERY, CANDIDATES, 3)) == ["best", "near duplicate", "different"]
+
+
+def test_first_pick_is_the_most_relevant():
+    assert names(mmr_select(QUERY, CANDIDATES, 1)) == ["best"]
+
+
+def test_prefers_a_diverse_candidate_over_a_near_duplicate():
+    assert names(mmr_select(QUERY, CANDIDATES, 2, lambda_mult=0.3)) == ["best", "different"]
+
+
+def test_lambda_one_is_pure_relevance():
+    assert names(mmr_select(QUERY, CANDIDATES, 2, lambda_mult=1.0)) == ["best", "near duplicate"]
+
+
+def test_similarity_ignores_vector_length():
+    scaled = [candidate(chunk.content, [value * 10 for value in chunk.embedding]) for chunk in CANDIDATES]
+    assert names(mmr_select([5.0, 0.0], scaled, 2, lambda_mult=0.3)) == ["best", "different"]
+
+
+def test_does_not_modify_the_candidate_embeddings():
+    mmr_select(QUERY, CANDIDATES, 2)
+    assert CANDIDATES[1].embedding == [0.99, 0.01]
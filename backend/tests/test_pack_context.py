@@ -0,0 +1,72 @@
+from chunking import chunk_document_with_overlap
+from rag_chat import RetrievedChunk, pack_context
+
+
+def retrieved(content, chunk_number, overlap_chars=0, document_id=1):
+    return RetrievedChunk(
+        document_id=document_id,
+        content=content,
+        filename="doc.pdf",
+        chunk_number=chunk_number,
+        token_count=None,
+        distance=0.0,
+        overlap_chars=overlap_chars,
+    )
+
+
+def test_adjacent_chunks_drop_recorded_overlap():
+    blocks = pack_context([retrieved("alpha beta gamma", 0), retrieved("gamma delta", 1, overlap_chars=5)])
+    assert len(blocks) == 1
+    assert blocks[0].content == "alpha beta gamma delta"
+    assert (blocks[0].first_chunk, blocks[0].last_chunk) == (0, 1)
+
+
+def test_chunks_without_overlap_are_joined_on_a_new_line():
+    # Speaker-turn chunks repeat nothing, even if the text happens to look like an overlap.
+    blocks = pack_context([retrieved("Speaker 1: see you there", 0), retrieved("there you go", 1, overlap_chars=0)])
+    assert blocks[0].content == "Speaker 1: see you there\nthere you go"
+
+
+def test_legacy_chunks_drop_the_fixed_window_overlap():
+    # Chunks indexed before overlap_chars was recorded are fixed windows overlapping by CHUNK_OVERLAP.
+    text = "".join(f"w{i:04d} " for i in range(400))
+    first, second = text[:1000], text[900:1900]
+    blocks = pack_context([retrieved(first, 0), retrieved(second, 1, overlap_chars=None)])
+    assert blocks[0].content == text[:1900]
+
+
+def test_legacy_chunks_that_do_not_overlap_are_kept_whole():
+    blocks = pack_context([retrieved("alpha beta", 0), retrieved("gamma delta", 1, overlap_chars=None)])
+    assert blocks[0].content == "alpha beta\ngamma delta"
+
+
+def test_overlap_that_does_not_match_is_kept():
+    blocks = pack_context([retrieved("alpha beta", 0), retrieved("gamma delta", 1, overlap_chars=5)])
+    assert blocks[0].content == "alpha beta\ngamma delta"
+
+
+def test_non_adjacent_chunks_stay_separate_in_retrieval_order():
+    blocks = pack_context([
+        retrieved("third", 2, document_id=1),
+        retrieved("other document", 0, document_id=2),
+        retrieved("first", 0, document_id=1),
+    ])
+    assert [block.content for block in blocks] == ["third", "other document", "first"]
+
+
+def test_fixed_chunks_reassemble_to_the_original_text():
+    text = " ".join(f"word{i}" for i in range(600))
+    chunks = list(chunk_document_with_overlap([text], strategy="fixed"))
+    assert len(chunks) > 2
+    blocks = pack_context(
+        [retrieved(content, number, overlap) for number, (content, overlap) in enumerate(chunks)],
+        token_budget=10**6,
+    )
+    assert len(blocks) == 1
+    assert blocks[0].content == text
+
+
+def test_over_budget_block_is_truncated():
+    blocks = pack_context([retrieved("x" * 400, 0)], token_budget=10)
+    assert len(blocks) == 1
+    assert 0 < len(blocks[0].content) < 400
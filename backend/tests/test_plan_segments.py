@@ -0,0 +1,52 @@
+import os
+
+os.environ.setdefault("GEMINI_API_KEY", "test") # tasks refuses to import without one
+
+import pytest
+
+import tasks
+from tasks import fixed_segment_plan, plan_segments, segment_offsets
+
+
+@pytest.fixture(autouse=True)
+def segmentation_settings(monkeypatch):
+    monkeypatch.setattr(tasks, "TRANSCRIBE_SEGMENT_SECONDS", 600)
+    monkeypatch.setattr(tasks, "TRANSCRIBE_CUT_WINDOW_SECONDS", 60)
+    monkeypatch.setattr(tasks, "TRANSCRIBE_SKIP_SILENCE_SECONDS", 20)
+
+
+def test_without_silences_cuts_at_the_target_length():
+    assert plan_segments(1500, []) == [(0.0, 600), (600, 1200), (1200, 1500)]
+
+
+def test_short_recording_is_one_segment():
+    assert plan_segments(640, []) == [(0.0, 640)]
+
+
+def test_cuts_at_the_pause_nearest_the_target():
+    silences = [(549.0, 551.0), (619.0, 621.0), (900.0, 901.0)]
+    assert plan_segments(1300, silences)[0] == (0.0, 620.0)
+
+
+def test_ignores_pauses_outside_the_cut_window():
+    assert plan_segments(1300, [(100.0, 101.0)])[0] == (0.0, 600)
+
+
+def test_skips_long_silences():
+    plan = plan_segments(1000, [(300.0, 700.0)])
+    assert plan == [(0.0, 300.25), (699.75, 1000)]
+
+
+def test_silence_at_the_end_is_left_out():
+    assert plan_segments(400, [(350.0, float("inf"))]) == [(0.0, 350.25)]
+
+
+def test_fixed_plan_matches_the_segment_muxer():
+    assert fixed_segment_plan(1250.5) == [(0, 600), (600, 1200), (1200, 1250.5)]
+
+
+def test_segment_offsets_are_indexed_and_rounded():
+    assert segment_offsets([(0.0, 620.123), (620.123, 900.0)]) == [
+        {"index": 0, "start": 0.0, "end": 620.12},
+        {"index": 1, "start": 620.12, "end": 900.0},
+    ]
@@ -0,0 +1,79 @@
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from models import TranscriptionJobStatus
+from transcription_scheduler import (
+    TRANSCRIBE_DISPATCH_TIMEOUT_MINUTES,
+    TRANSCRIBE_STALE_JOB_MINUTES,
+    _fail_stale_jobs,
+    _requeue_unstarted_jobs,
+    fair_order,
+)
+
+START = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def job(job_id, user_id, minute=None, status=TranscriptionJobStatus.PENDING, updated_at=None, started_at=None):
+    return SimpleNamespace(
+        id=job_id,
+        user_id=user_id,
+        created_at=START + timedelta(minutes=job_id if minute is None else minute),
+        status=status,
+        updated_at=updated_at,
+        started_at=started_at,
+        celery_task_id="task" if started_at else None,
+        progress_text="Starting...",
+        error_message=None,
+        finished_at=None,
+    )
+
+
+def ids(jobs):
+    return [j.id for j in jobs]
+
+
+def test_fair_order_is_oldest_first_for_one_user():
+    assert ids(fair_order([job(3, 1), job(1, 1), job(2, 1)], {})) == [1, 2, 3]
+
+
+def test_fair_order_alternates_between_users():
+    # User 1 uploaded three files before user 2 uploaded theirs.
+    queued = [job(1, 1), job(2, 1), job(3, 1), job(4, 2), job(5, 2)]
+    assert ids(fair_order(queued, {})) == [1, 4, 2, 5, 3]
+
+
+def test_fair_order_counts_running_jobs_against_the_user():
+    queued = [job(1, 1), job(2, 2)]
+    assert ids(fair_order(queued, {1: 1})) == [2, 1]
+
+
+def test_fair_order_breaks_ties_by_id():
+    queued = [job(2, 2, minute=0), job(1, 1, minute=0)]
+    assert ids(fair_order(queued, {})) == [1, 2]
+
+
+def test_only_started_jobs_go_stale():
+    old = datetime.now(timezone.utc) - timedelta(minutes=TRANSCRIBE_STALE_JOB_MINUTES + 1)
+    fresh = datetime.now(timezone.utc)
+    dead = job(1, 1, status=TranscriptionJobStatus.PROCESSING, updated_at=old)
+    running = job(2, 1, status=TranscriptionJobStatus.PROCESSING, updated_at=fresh)
+    dispatched = job(3, 2, status=TranscriptionJobStatus.PENDING, updated_at=old)
+
+    assert ids(_fail_stale_jobs([dead, running, dispatched])) == [2, 3]
+    assert dead.status == TranscriptionJobStatus.FAILED
+    assert dead.finished_at is not None
+    assert dispatched.status == TranscriptionJobStatus.PENDING
+
+
+def test_dispatched_jobs_that_never_start_are_requeued():
+    now = datetime.now(timezone.utc)
+    expired = now - timedelta(minutes=TRANSCRIBE_DISPATCH_TIMEOUT_MINUTES + 1)
+    lost = job(1, 1, started_at=expired)
+    waiting = job(2, 1, started_at=now)
+    running = job(3, 2, status=TranscriptionJobStatus.PROCESSING, started_at=expired, updated_at=now)
+
+    assert ids(_requeue_unstarted_jobs([lost, waiting, running])) == [2, 3]
+    assert lost.status == TranscriptionJobStatus.PENDING
+    assert lost.celery_task_id is None
+    assert lost.started_at is None
+    assert running.celery_task_id == "task"
@@ -0,0 +1,182 @@
+import logging
+import os
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from math import ceil
+from typing import Dict, List
+
+from sqlalchemy import and_, or_, text
+from sqlalchemy.orm import Session
+
+from models import TranscriptionJob, TranscriptionJobStatus
+
+logger = logging.getLogger(__name__)
+
+# --- Scheduler settings ---
+# Transcription jobs running at once across all users; match it to the transcription workers' total concurrency.
+TRANSCRIBE_MAX_ACTIVE_JOBS = int(os.getenv("TRANSCRIBE_MAX_ACTIVE_JOBS", 2))
+TRANSCRIBE_MAX_ACTIVE_JOBS_PER_USER = int(os.getenv("TRANSCRIBE_MAX_ACTIVE_JOBS_PER_USER", 1))
+# Jobs one user may have waiting or running; more are rejected with 429.
+TRANSCRIBE_MAX_QUEUED_JOBS_PER_USER = int(os.getenv("TRANSCRIBE_MAX_QUEUED_JOBS_PER_USER", 10))
+# A PROCESSING job whose worker heartbeat (updated_at) is this old is considered dead and marked FAILED.
+TRANSCRIBE_STALE_JOB_MINUTES = int(os.getenv("TRANSCRIBE_STALE_JOB_MINUTES", 45))
+# A dispatched job that no worker has started after this long (lost message, API or worker died
+# in between) gets its slot back and is queued again.
+TRANSCRIBE_DISPATCH_TIMEOUT_MINUTES = int(os.getenv("TRANSCRIBE_DISPATCH_TIMEOUT_MINUTES", 15))
+# Job duration assumed for ETAs until there are finished jobs to average over.
+TRANSCRIBE_DEFAULT_JOB_SECONDS = int(os.getenv("TRANSCRIBE_DEFAULT_JOB_SECONDS", 600))
+# pg_advisory_xact_lock key serialising dispatch between the API and the workers.
+SCHEDULER_LOCK_ID = 7263513
+
+# A job is queued until the scheduler gives it a Celery task id, and active from then on.
+# Jobs without a saved file are still uploading and aren't scheduled yet.
+QUEUED_JOB = and_(
+    TranscriptionJob.status == TranscriptionJobStatus.PENDING,
+    TranscriptionJob.celery_task_id.is_(None),
+    TranscriptionJob.saved_file_name.isnot(None),
+)
+ACTIVE_JOB = or_(
+    TranscriptionJob.status == TranscriptionJobStatus.PROCESSING,
+    and_(TranscriptionJob.status == TranscriptionJobStatus.PENDING, TranscriptionJob.celery_task_id.isnot(None)),
+)
+
+
+def count_open_jobs(user_id: int, db: Session) -> int:
+    """Jobs of the user that are queued or running, for the per-user quota."""
+    return db.query(TranscriptionJob).filter(
+        TranscriptionJob.user_id == user_id,
+        TranscriptionJob.status.in_([TranscriptionJobStatus.PENDING, TranscriptionJobStatus.PROCESSING]),
+    ).count()
+
+
+def fair_order(queued: List[TranscriptionJob], active_per_user: Dict[int, int]) -> List[TranscriptionJob]:
+    """
+    Orders queued jobs round-robin between users: a user's n-th waiting job is in round
+    n + (jobs the user already has running), and jobs in the same round go oldest first.
+    A user who uploads ten files therefore can't hold back everyone else's first file.
+    """
+    rank = Counter()
+    keyed = []
+    for job in sorted(queued, key=lambda j: (j.created_at, j.id)):
+        keyed.append(((active_per_user.get(job.user_id, 0) + rank[job.user_id], job.created_at, job.id), job))
+        rank[job.user_id] += 1
+    return [job for _, job in sorted(keyed, key=lambda item: item[0])]
+
+
+def average_job_seconds(db: Session) -> float:
+    """Mean run time of the last 20 completed jobs, or TRANSCRIBE_DEFAULT_JOB_SECONDS."""
+    recent = (
+        db.query(TranscriptionJob.started_at, TranscriptionJob.finished_at)
+        .filter(
+            TranscriptionJob.status == TranscriptionJobStatus.COMPLETED,
+            TranscriptionJob.started_at.isnot(None),
+            TranscriptionJob.finished_at.isnot(None),
+        )
+        .order_by(TranscriptionJob.finished_at.desc())
+        .limit(20)
+        .all()
+    )
+    durations = [(finished - started).total_seconds() for started, finished in recent if finished > started]
+    return sum(durations) / len(durations) if durations else TRANSCRIBE_DEFAULT_JOB_SECONDS
+
+
+def _fail_stale_jobs(active: List[TranscriptionJob]) -> List[TranscriptionJob]:
+    """
+    Fails PROCESSING jobs whose worker stopped refreshing updated_at (see tasks.TRANSCRIBE_HEARTBEAT_SECONDS)
+    and returns the rest. Dispatched jobs that no worker has started yet are only waiting in the broker.
+    """
+    threshold = datetime.now(timezone.utc) - timedelta(minutes=TRANSCRIBE_STALE_JOB_MINUTES)
+    alive = []
+    for job in active:
+        if job.status == TranscriptionJobStatus.PROCESSING and job.updated_at and job.updated_at < threshold:
+            logger.warning(f"Found and failed stale job (ID: {job.id}) that was stuck in '{job.status.value}' state.")
+            job.status = TranscriptionJobStatus.FAILED
+            job.error_message = "Task timed out and was marked as failed."
+            job.finished_at = datetime.now(timezone.utc)
+        else:
+            alive.append(job)
+    return alive
+
+
+def _requeue_unstarted_jobs(active: List[TranscriptionJob]) -> List[TranscriptionJob]:
+    """
+    Puts dispatched jobs that no worker started within TRANSCRIBE_DISPATCH_TIMEOUT_MINUTES back
+    in the queue and returns the rest. The old task message, if it is ever delivered, no longer
+    matches the job's celery_task_id and doesn't start it.
+    """
+    threshold = datetime.now(timezone.utc) - timedelta(minutes=TRANSCRIBE_DISPATCH_TIMEOUT_MINUTES)
+    alive = []
+    for job in active:
+        if job.status == TranscriptionJobStatus.PENDING and job.started_at and job.started_at < threshold:
+            logger.warning(f"Transcription job {job.id} was dispatched but not started; queueing it again.")
+            job.celery_task_id = None
+            job.started_at = None
+            job.progress_text = "File uploaded, awaiting processing."
+        else:
+            alive.append(job)
+    return alive
+
+
+def _send(job: TranscriptionJob) -> None:
+    from tasks import UPLOAD_DIR, transcribe_audio_task
+
+    transcribe_audio_task.apply_async(args=[job.id, str(UPLOAD_DIR / job.saved_file_name)], task_id=job.celery_task_id)
+
+
+def dispatch_transcription_jobs(db: Session) -> List[int]:
+    """
+    Starts as many queued jobs as the global and per-user limits allow, in fair_order, and
+    writes every still-waiting job's queue position and ETA to its progress_text.
+
+    Call it whenever a slot may have opened or a job was queued: on upload, cancel and delete
+    and when a transcription task finishes. Dispatch is serialised with an advisory lock, so
+    concurrent callers can't overshoot the limits. Commits the session. Returns started job ids.
+    """
+    db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": SCHEDULER_LOCK_ID})
+    active = _requeue_unstarted_jobs(_fail_stale_jobs(db.query(TranscriptionJob).filter(ACTIVE_JOB).all()))
+    db.flush() # Requeued jobs are picked up by the QUEUED_JOB query below
+    queued = db.query(TranscriptionJob).filter(QUEUED_JOB).all()
+
+    active_per_user = Counter(job.user_id for job in active)
+    free_slots = TRANSCRIBE_MAX_ACTIVE_JOBS - len(active)
+    started, waiting = [], []
+    for job in fair_order(queued, active_per_user):
+        if free_slots > 0 and active_per_user[job.user_id] < TRANSCRIBE_MAX_ACTIVE_JOBS_PER_USER:
+            job.celery_task_id = str(uuid.uuid4())
+            job.started_at = datetime.now(timezone.utc)
+            job.progress_text = "Starting..."
+            active_per_user[job.user_id] += 1
+            free_slots -= 1
+            started.append(job)
+        else:
+            waiting.append(job)
+
+    if waiting:
+        job_seconds = average_job_seconds(db)
+        user_rank = Counter()
+        for position, job in enumerate(waiting, start=1):
+            # Waves of jobs ahead of this one: limited by the global slots and by the user's own quota.
+            waves = max(
+                ceil(position / max(1, TRANSCRIBE_MAX_ACTIVE_JOBS)),
+                (active_per_user[job.user_id] + user_rank[job.user_id]) // max(1, TRANSCRIBE_MAX_ACTIVE_JOBS_PER_USER),
+            )
+            user_rank[job.user_id] += 1
+            eta_minutes = max(1, round(waves * job_seconds / 60))
+            progress_text = f"Queued: position {position} of {len(waiting)}, estimated start in ~{eta_minutes} min."
+            if job.progress_text != progress_text:
+                job.progress_text = progress_text
+    # Commit (and release the lock) before sending, so a task never starts ahead of its job row.
+    db.commit()
+
+    for job in started:
+        try:
+            _send(job)
+            logger.info(f"Dispatched transcription job {job.id} for user {job.user_id}")
+        except Exception as e:
+            logger.error(f"Failed to dispatch transcription job {job.id}: {e}")
+            job.celery_task_id = None
+            job.started_at = None
+            job.progress_text = "File uploaded, awaiting processing."
+            db.commit()
+    return [job.id for job in started if job.celery_task_id]
@@ -191,7 +191,7 @@ function Transcribe() {
                 body: formData
             });
 
-            if (response.status === 409) {
+            if (response.status === 429) {
                 const errData = await response.json();
                 setError(errData.detail);
             } else if (!response.ok) {
@@ -479,8 +479,7 @@ function Transcribe() {
         }
     };
 
-    const hasActiveJob = jobs.some(job => job.status === 'PENDING' || job.status === 'PROCESSING');
-    const isUploadDisabled = isTranscribing || hasActiveJob;
+    const isUploadDisabled = isTranscribing; // New jobs are queued by the server
     
     const filteredJobs = jobs.filter(job =>
         job.original_filename.toLowerCase().includes(searchTerm.toLowerCase()) ||
@@ -576,6 +575,9 @@ function Transcribe() {
                                         <p className={`text-sm ${job.status === 'COMPLETED' ? 'text-green-600' : job.status === 'FAILED' ? 'text-red-600' : job.status === 'CANCELLED' ? 'text-orange-500' : 'text-blue-500'}`}>
                                             Status: {job.status} {job.status === 'PROCESSING' && `(${job.progress_percent}%)`}
                                         </p>
+                                        {job.status === 'PENDING' && job.progress_text && (
+                                            <p className="text-xs text-gray-500 italic mt-1 truncate">{job.progress_text}</p>
+                                        )}
                                         {job.error_message && job.status === 'FAILED' && (
                                             <p className="text-xs text-red-500 italic mt-1 truncate">Error: {job.error_message}</p>
                                         )}